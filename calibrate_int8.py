@@ -0,0 +1,58 @@
+import os
+import cv2
+from absl import app, flags
+from absl.flags import FLAGS
+from retinaface import RetinaFace
+from networks.tflite_converter import convert_to_tflite
+
+flags.DEFINE_string('weights_path', './data/retinafaceweights.npy',
+                    'network weights path')
+flags.DEFINE_string('calibration_dir', './sample-images/', 'directory of representative images')
+flags.DEFINE_integer('num_calibration_images', 100, 'maximum number of calibration images')
+flags.DEFINE_string('save_destination', './data/retinaface_int8.tflite', 'destination .tflite file')
+flags.DEFINE_integer('size', 640, 'fixed input size, multiple of 32')
+flags.DEFINE_bool('fuse_bn', True, "whether to fold batch normalizations into convolutions")
+flags.DEFINE_bool('sigmoid_scores', False, "whether to export the sigmoid score heads")
+
+
+def calibration_images(images_dir, max_images):
+    """
+    Paths of the images of a directory, walked recursively
+    :param images_dir: directory of representative images
+    :param max_images: maximum number of images
+    :return: sorted list of image paths
+    """
+    paths = []
+    for root, _, files in os.walk(images_dir):
+        for file in files:
+            if file.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
+                paths.append(os.path.join(root, file))
+    return sorted(paths)[:max_images]
+
+
+def _main(_argv):
+    # the detector preprocessing is reused so that calibration sees exactly the inputs of inference
+    detector = RetinaFace(FLAGS.weights_path, False, fuse_bn=FLAGS.fuse_bn, sigmoid_scores=FLAGS.sigmoid_scores,
+                          input_size=(FLAGS.size, FLAGS.size))
+    paths = calibration_images(FLAGS.calibration_dir, FLAGS.num_calibration_images)
+    if not paths:
+        raise ValueError('no calibration images found in %s' % FLAGS.calibration_dir)
+    print('calibrating on', len(paths), 'images')
+
+    def representative_dataset():
+        for path in paths:
+            img = cv2.imread(path)
+            im_tensor, _, _ = detector.preprocess_batch([img])
+            yield [im_tensor]
+
+    tflite_model = convert_to_tflite(detector.model, FLAGS.size, representative_dataset=representative_dataset)
+    with open(FLAGS.save_destination, 'wb') as f:
+        f.write(tflite_model)
+    print('saved', FLAGS.save_destination)
+
+
+if __name__ == '__main__':
+    try:
+        app.run(_main)
+    except SystemExit:
+        pass
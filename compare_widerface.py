@@ -0,0 +1,51 @@
+import os
+import sys
+from absl import app, flags
+from absl.flags import FLAGS
+from retinaface import RetinaFace
+from eval_widerface import run_widerface
+
+flags.DEFINE_string('int8_model_path', './data/retinaface_int8.tflite', 'int8 model made by calibrate_int8.py')
+flags.DEFINE_string('gt_path', './WiderFace-Evaluation/ground_truth/', 'widerface ground truth directory')
+flags.DEFINE_bool('same_input_size', True, 'run the float model at the fixed input size of the int8 model, so '
+                  'that the comparison only measures quantization')
+
+
+def _main(_argv):
+    # evaluation.py relies on the bbox extension built in its own directory
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'WiderFace-Evaluation'))
+    from evaluation import evaluation
+
+    # the keras model runs on the TF thread pools, limit them like the tflite interpreter threads so that
+    # both models are timed on the same number of cores. Must happen before TF is initialized
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(FLAGS.num_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(FLAGS.num_threads)
+
+    int8_detector = RetinaFace(FLAGS.int8_model_path, use_gpu_nms=False, backend='int8',
+                               num_threads=FLAGS.num_threads)
+    input_size = int8_detector.input_size if FLAGS.same_input_size else None
+    float_detector = RetinaFace(FLAGS.weights_path, use_gpu_nms=False, input_size=input_size,
+                                num_threads=FLAGS.num_threads)
+
+    results = []
+    for name, detector in [('float', float_detector), ('int8', int8_detector)]:
+        save_folder = os.path.join(FLAGS.save_folder, name)
+        if not os.path.isdir(FLAGS.save_folder):
+            os.mkdir(FLAGS.save_folder)
+        # results of a previous run, e.g. before a new calibration, are overwritten rather than reused
+        mean_time = run_widerface(detector, FLAGS.widerface_data_dir, save_folder, skip_existing=False)
+        aps = evaluation(save_folder, FLAGS.gt_path)
+        results.append((name, aps, mean_time))
+
+    print('| Model | Easy | Medium | Hard | ms/image |')
+    print('|---|---|---|---|---|')
+    for name, aps, mean_time in results:
+        print('| %s | %.1f | %.1f | %.1f | %.1f |' % (name, aps[0] * 100, aps[1] * 100, aps[2] * 100, mean_time * 1000))
+
+
+if __name__ == '__main__':
+    try:
+        app.run(_main)
+    except SystemExit:
+        pass
@@ -0,0 +1,24 @@
+from absl import app, flags
+from absl.flags import FLAGS
+from networks.network_utils import load_weights, fuse_batch_normalization, save_weights_mmap
+
+flags.DEFINE_string('weights_path', './data/retinafaceweights.npy',
+                    'network weights path')
+flags.DEFINE_string('save_destination', './data/retinafaceweights.mmap', 'destination memory mappable weights file')
+flags.DEFINE_bool('fuse_bn', False, "whether to store the weights with batch normalizations already folded, "
+                  "so that fuse_bn networks are built without copying them")
+
+
+def _main(_argv):
+    weights_dict = load_weights(FLAGS.weights_path)
+    if FLAGS.fuse_bn:
+        weights_dict = fuse_batch_normalization(weights_dict)
+    save_weights_mmap(weights_dict, FLAGS.save_destination)
+    print('saved', FLAGS.save_destination)
+
+
+if __name__ == '__main__':
+    try:
+        app.run(_main)
+    except SystemExit:
+        pass
@@ -3,34 +3,72 @@ import numpy as np
 from absl import app, flags
 from absl.flags import FLAGS
 from retinaface import RetinaFace
+from retinaface_video import VideoRetinaFace
 
 flags.DEFINE_string('weights_path', './data/retinafaceweights.npy',
                     'network weights path')
 flags.DEFINE_string('sample_img', './sample-images/random_internet_selfie.jpg', 'image to test on')
 flags.DEFINE_string('save_destination', 'retinaface_tf2_output.jpg', "destination image")
+flags.DEFINE_string('video', '', "video file or camera index to run on instead of sample_img, "
+                    "the annotated video is written to save_destination")
+flags.DEFINE_integer('full_every', 30, "video mode: run a full frame detection at least every full_every frames")
+flags.DEFINE_float('motion_thresh', 2.0, "video mode: skip frames whose mean gray level difference from the last "
+                   "processed frame is below this threshold, 0 to disable")
 flags.DEFINE_float('det_thresh', 0.9, "detection threshold")
 flags.DEFINE_float('nms_thresh', 0.4, "nms threshold")
 flags.DEFINE_bool('use_gpu_nms', True, "whether to use gpu for nms")
+flags.DEFINE_integer('target_size', 1024, "size the short side of the image is resized to")
+flags.DEFINE_integer('max_size', 1980, "maximum size of the long side of the resized image")
+flags.DEFINE_integer('min_face_size', 0, "if set, resize the image so that faces of this size in pixels are just "
+                     "detectable, instead of using target_size")
 
 
-def _main(_argv):
-    detector = RetinaFace(FLAGS.weights_path, FLAGS.use_gpu_nms, FLAGS.nms_thresh)
-    img = cv2.imread(FLAGS.sample_img)
-    faces, landmarks = detector.detect(img, FLAGS.det_thresh)
+def draw(img, faces, landmarks):
+    """
+    Draw faces and landmarks on an image, in place
+    """
     if faces is not None:
-        print('found', faces.shape[0], 'faces')
         for i in range(faces.shape[0]):
-            box = faces[i].astype(np.int)
+            box = faces[i].astype(int)
             color = (0, 0, 255)
             cv2.rectangle(img, (box[0], box[1]), (box[2], box[3]), color, 2)
             if landmarks is not None:
-                landmark5 = landmarks[i].astype(np.int)
+                landmark5 = landmarks[i].astype(int)
                 for l in range(landmark5.shape[0]):
                     color = (0, 0, 255)
                     if l == 0 or l == 3:
                         color = (0, 255, 0)
                     cv2.circle(img, (landmark5[l][0], landmark5[l][1]), 1, color, 1)
 
+
+def _run_video(detector):
+    capture = cv2.VideoCapture(int(FLAGS.video) if FLAGS.video.isdigit() else FLAGS.video)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25
+    writer = None
+    video_detector = VideoRetinaFace(detector, FLAGS.det_thresh, motion_threshold=FLAGS.motion_thresh,
+                                     full_every=FLAGS.full_every)
+    for frame, faces, landmarks, mode in video_detector.detect_stream(VideoRetinaFace.read_frames(capture)):
+        if writer is None:
+            writer = cv2.VideoWriter(FLAGS.save_destination, cv2.VideoWriter_fourcc(*'mp4v'), fps,
+                                     (frame.shape[1], frame.shape[0]))
+        draw(frame, faces, landmarks)
+        writer.write(frame)
+    capture.release()
+    if writer is not None:
+        writer.release()
+    print(video_detector.stats)
+
+
+def _main(_argv):
+    detector = RetinaFace(FLAGS.weights_path, FLAGS.use_gpu_nms, FLAGS.nms_thresh, target_size=FLAGS.target_size,
+                          max_size=FLAGS.max_size, min_face_size=FLAGS.min_face_size or None)
+    if FLAGS.video:
+        return _run_video(detector)
+    img = cv2.imread(FLAGS.sample_img)
+    faces, landmarks = detector.detect(img, FLAGS.det_thresh)
+    if faces is not None:
+        print('found', faces.shape[0], 'faces')
+    draw(img, faces, landmarks)
     cv2.imwrite(FLAGS.save_destination, img)
 
 
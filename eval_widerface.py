@@ -1,4 +1,5 @@
 import os
+import time
 import cv2
 import numpy as np
 from absl import app, flags, logging
@@ -10,38 +11,78 @@ flags.DEFINE_string('weights_path', './data/retinafaceweights.npy',
 flags.DEFINE_string('widerface_data_dir', '/home/bertrans/Downloads/WIDER_val/images/', 'data directory of widerface test set')
 flags.DEFINE_string('save_folder', './WiderFace-Evaluation/results_val/',
                     'folder path to save evaluate results')
+flags.DEFINE_enum('backend', 'keras', ['keras', 'saved_model', 'tflite', 'int8', 'onnx'], 'inference backend, '
+                  'weights_path is the exported model with saved_model, tflite, int8 and onnx')
+flags.DEFINE_integer('num_threads', 1, 'number of CPU threads of the tflite interpreter or onnxruntime')
+flags.DEFINE_bool('stream', False, 'overlap image reading, inference and post-processing')
+flags.DEFINE_integer('pre_nms_topk', 0, 'maximum number of proposals per image going through nms, 0 for no limit')
+flags.DEFINE_integer('max_detections', 0, 'maximum number of faces per image, 0 for no limit')
 
 
-def _main(_argv):
-    detector = RetinaFace(FLAGS.weights_path, use_gpu_nms = False)
-    if not os.path.isdir(FLAGS.save_folder):
-        os.mkdir(FLAGS.save_folder)
-    subdirs = [x[0] for x in os.walk(FLAGS.widerface_data_dir)][1:]
-    save_dir = FLAGS.save_folder
+def run_widerface(detector, data_dir, save_folder, stream=False, skip_existing=True):
+    """
+    Detect faces on the widerface images and write the results in the WiderFace-Evaluation format
+    :param detector: RetinaFace detector
+    :param data_dir: images directory of the widerface set, one sub directory per event
+    :param save_folder: results directory
+    :param stream: overlap image reading, inference and post-processing with detect_stream
+    :param skip_existing: skip the images that already have a result file, to resume an interrupted run
+    :return: mean time per image in seconds, over the images processed by this call. Detection time only,
+        or the wall time including image reading with stream
+    """
+    if not os.path.isdir(save_folder):
+        os.mkdir(save_folder)
+    subdirs = [x[0] for x in os.walk(data_dir)][1:]
+    save_dir = save_folder
+    jobs = []
     for subdir in subdirs:
-        print(subdir)
         output_dir = os.path.join(save_dir, subdir.split("/")[-1])
         if not os.path.isdir(output_dir):
             os.mkdir(output_dir)
         for file in os.listdir(subdir):
-            if os.path.isfile(os.path.join(output_dir, file.replace("jpg", "txt"))):
+            if skip_existing and os.path.isfile(os.path.join(output_dir, file.replace("jpg", "txt"))):
                 continue
-            img = cv2.imread(os.path.join(subdir, file))
+            jobs.append((os.path.join(subdir, file), os.path.join(output_dir, file.replace("jpg", "txt"))))
+
+    total_time = 0.0
+    if stream:
+        start = time.time()
+        results = detector.detect_stream([image_path for image_path, _ in jobs], 0.01)
+    else:
+        results = None
+    for image_path, output_path in jobs:
+        if results is not None:
+            faces, ldmks = next(results)
+        else:
+            img = cv2.imread(image_path)
+            start = time.time()
             faces, ldmks = detector.detect(img, 0.01)
-            with open(os.path.join(output_dir, file.replace("jpg", "txt")), "w+") as f:
-                f.write(file.split("/")[-1].split(".")[0] + "\n")
-                f.write(str(len(faces)) + "\n")
-                for face in faces:
-                    f.write(str(int(face[0]))
-                            + " "
-                            + str(int(face[1]))
-                            + " "
-                            + str(int(face[2]) - int(face[0]))
-                            + " "
-                            + str(int(face[3]) - int(face[1]))
-                            + " "
-                            + str(face[4])
-                            + "\n")
+            total_time += time.time() - start
+        with open(output_path, "w+") as f:
+            f.write(os.path.basename(image_path).split(".")[0] + "\n")
+            f.write(str(len(faces)) + "\n")
+            for face in faces:
+                f.write(str(int(face[0]))
+                        + " "
+                        + str(int(face[1]))
+                        + " "
+                        + str(int(face[2]) - int(face[0]))
+                        + " "
+                        + str(int(face[3]) - int(face[1]))
+                        + " "
+                        + str(face[4])
+                        + "\n")
+    if stream:
+        total_time = time.time() - start
+    return total_time / max(len(jobs), 1)
+
+
+def _main(_argv):
+    detector = RetinaFace(FLAGS.weights_path, use_gpu_nms = False, backend=FLAGS.backend,
+                          num_threads=FLAGS.num_threads, pre_nms_topk=FLAGS.pre_nms_topk or None,
+                          max_detections=FLAGS.max_detections or None)
+    mean_time = run_widerface(detector, FLAGS.widerface_data_dir, FLAGS.save_folder, stream=FLAGS.stream)
+    print('mean time per image: %.1f ms' % (mean_time * 1000))
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,27 @@
+from absl import app, flags
+from absl.flags import FLAGS
+from networks.retinaface_network import RetinaFaceNetwork
+from networks.onnx_converter import convert_to_onnx
+
+flags.DEFINE_string('weights_path', './data/retinafaceweights.npy',
+                    'network weights path')
+flags.DEFINE_string('save_destination', './data/retinaface.onnx', 'destination .onnx file')
+flags.DEFINE_integer('size', 0, 'fixed input size, multiple of 32, 0 to export a model with dynamic height and width')
+flags.DEFINE_integer('opset', 13, 'ONNX opset version')
+flags.DEFINE_bool('fuse_bn', True, "whether to fold batch normalizations into convolutions")
+flags.DEFINE_bool('sigmoid_scores', False, "whether to export the sigmoid score heads")
+
+
+def _main(_argv):
+    network = RetinaFaceNetwork(FLAGS.weights_path, fuse_bn=FLAGS.fuse_bn, sigmoid_scores=FLAGS.sigmoid_scores)
+    onnx_model = convert_to_onnx(network.model, FLAGS.size if FLAGS.size > 0 else None, opset=FLAGS.opset)
+    with open(FLAGS.save_destination, 'wb') as f:
+        f.write(onnx_model.SerializeToString())
+    print('saved', FLAGS.save_destination)
+
+
+if __name__ == '__main__':
+    try:
+        app.run(_main)
+    except SystemExit:
+        pass
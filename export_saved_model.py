@@ -0,0 +1,23 @@
+from absl import app, flags
+from absl.flags import FLAGS
+from networks.retinaface_network import RetinaFaceNetwork
+from networks.saved_model_converter import convert_to_saved_model
+
+flags.DEFINE_string('weights_path', './data/retinafaceweights.npy',
+                    'network weights path')
+flags.DEFINE_string('save_destination', './data/retinaface_saved_model', 'destination SavedModel directory')
+flags.DEFINE_bool('fuse_bn', True, "whether to fold batch normalizations into convolutions")
+flags.DEFINE_bool('sigmoid_scores', False, "whether to export the sigmoid score heads")
+
+
+def _main(_argv):
+    network = RetinaFaceNetwork(FLAGS.weights_path, fuse_bn=FLAGS.fuse_bn, sigmoid_scores=FLAGS.sigmoid_scores)
+    convert_to_saved_model(network.model, FLAGS.save_destination)
+    print('saved', FLAGS.save_destination)
+
+
+if __name__ == '__main__':
+    try:
+        app.run(_main)
+    except SystemExit:
+        pass
@@ -0,0 +1,26 @@
+from absl import app, flags
+from absl.flags import FLAGS
+from networks.retinaface_network import RetinaFaceNetwork
+from networks.tflite_converter import convert_to_tflite
+
+flags.DEFINE_string('weights_path', './data/retinafaceweights.npy',
+                    'network weights path')
+flags.DEFINE_string('save_destination', './data/retinaface.tflite', 'destination .tflite file')
+flags.DEFINE_integer('size', 640, 'fixed input size, multiple of 32, 0 to export a model with dynamic height and width')
+flags.DEFINE_bool('fuse_bn', True, "whether to fold batch normalizations into convolutions")
+flags.DEFINE_bool('sigmoid_scores', False, "whether to export the sigmoid score heads")
+
+
+def _main(_argv):
+    network = RetinaFaceNetwork(FLAGS.weights_path, fuse_bn=FLAGS.fuse_bn, sigmoid_scores=FLAGS.sigmoid_scores)
+    tflite_model = convert_to_tflite(network.model, FLAGS.size if FLAGS.size > 0 else None)
+    with open(FLAGS.save_destination, 'wb') as f:
+        f.write(tflite_model)
+    print('saved', FLAGS.save_destination)
+
+
+if __name__ == '__main__':
+    try:
+        app.run(_main)
+    except SystemExit:
+        pass
@@ -0,0 +1,175 @@
+import os
+import numpy as np
+try:
+    import tensorflow as tf
+except ImportError:
+    # onnxruntime only deployments
+    tf = None
+
+
+class TFLiteBackend(object):
+    """
+    Runs an exported RetinaFace .tflite model with the TFLite interpreter.
+    On CPU the float kernels are executed by the XNNPACK delegate, which TF enables by default.
+    Takes a NHWC float32 batch and returns the 9 NHWC outputs in the keras model order.
+    Inputs of full integer quantized models are quantized, and their outputs dequantized, with the
+    scale and zero point of the tensors, so they are used exactly like float models
+    """
+    def __init__(self, model_path, num_threads=1):
+        """
+        :param model_path: path to .tflite model
+        :param num_threads: number of threads of the interpreter and XNNPACK
+        """
+        self.model_path = model_path
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        input_details = self.interpreter.get_input_details()[0]
+        self.input_index = input_details['index']
+        self.input_shape = tuple(input_details['shape'])
+        self.input_dtype = input_details['dtype']
+        self.input_quantization = input_details['quantization']
+        self.quantized = self.input_dtype in (np.int8, np.uint8)
+        signature = input_details.get('shape_signature', input_details['shape'])
+        # models exported with a dynamic height and width can be resized to any bucket
+        self.fixed_size = None if -1 in signature[1:3] else (int(self.input_shape[1]), int(self.input_shape[2]))
+        self.output_indices = None
+
+    def _sort_outputs(self):
+        """
+        TFLite does not preserve the keras output order, sort outputs back by stride then by channels:
+        cls (2A or A), bbox (4A), landmark (10A), from the coarsest stride 32 feature map to stride 8.
+        Output shapes of dynamic models are only known once the interpreter ran
+        """
+        shapes = [(d['index'], self.interpreter.get_tensor(d['index']).shape)
+                  for d in self.interpreter.get_output_details()]
+        self.output_indices = [index for index, shape in sorted(shapes, key=lambda x: (x[1][1], x[1][3]))]
+        quantization = dict((d['index'], d['quantization']) for d in self.interpreter.get_output_details())
+        self.output_quantization = [quantization[index] for index in self.output_indices]
+
+    def weights_nbytes(self):
+        """
+        :return: size of the model file, whose constant buffers hold the weights
+        """
+        return os.path.getsize(self.model_path)
+
+    def _quantize(self, im_tensor):
+        """
+        Quantize a float batch to the integer input type of the model
+        :param im_tensor: NHWC float32 batch
+        :return: NHWC int8 or uint8 batch
+        """
+        scale, zero_point = self.input_quantization
+        info = np.iinfo(self.input_dtype)
+        q = np.round(im_tensor / scale) + zero_point
+        return np.clip(q, info.min, info.max).astype(self.input_dtype)
+
+    @staticmethod
+    def _dequantize(output, quantization):
+        """
+        :param output: integer output tensor
+        :param quantization: (scale, zero_point) of the output
+        :return: float32 array
+        """
+        scale, zero_point = quantization
+        return (output.astype(np.float32) - zero_point) * np.float32(scale)
+
+    def __call__(self, im_tensor):
+        """
+        :param im_tensor: NHWC float32 batch
+        :return: list of NHWC numpy outputs, 3 per stride
+        """
+        if tuple(im_tensor.shape) != self.input_shape:
+            self.interpreter.resize_tensor_input(self.input_index, im_tensor.shape)
+            self.interpreter.allocate_tensors()
+            self.input_shape = tuple(im_tensor.shape)
+            self.output_indices = None
+        if self.quantized:
+            self.interpreter.set_tensor(self.input_index, self._quantize(im_tensor))
+        else:
+            self.interpreter.set_tensor(self.input_index, np.ascontiguousarray(im_tensor, dtype=np.float32))
+        self.interpreter.invoke()
+        if self.output_indices is None:
+            self._sort_outputs()
+        if self.quantized:
+            return [self._dequantize(self.interpreter.get_tensor(index), quantization)
+                    for index, quantization in zip(self.output_indices, self.output_quantization)]
+        return [self.interpreter.get_tensor(index) for index in self.output_indices]
+
+
+class SavedModelBackend(object):
+    """
+    Runs a RetinaFace SavedModel exported by export_saved_model.py.
+    The traced graph and its variables are restored as is, so no keras layer is built in python.
+    Takes a NHWC float32 batch and returns the 9 NHWC outputs in the keras model order
+    """
+    def __init__(self, model_path):
+        """
+        :param model_path: path to the SavedModel directory
+        """
+        self.model = tf.saved_model.load(model_path)
+        self.fixed_size = None
+        self.quantized = False
+
+    def weights_nbytes(self):
+        """
+        :return: size of the restored variables
+        """
+        return sum(int(np.prod(v.shape)) * v.dtype.size for v in self.model.variables_list)
+
+    def __call__(self, im_tensor):
+        """
+        :param im_tensor: NHWC float32 batch
+        :return: list of NHWC numpy outputs, 3 per stride
+        """
+        net_out = self.model.serve(tf.convert_to_tensor(im_tensor, dtype=tf.float32))
+        return [out.numpy() for out in net_out]
+
+
+class OnnxRuntimeBackend(object):
+    """
+    Runs an exported RetinaFace .onnx model with onnxruntime on CPU, without any TensorFlow dependency.
+    Takes a NHWC float32 batch and returns the 9 NHWC outputs in the keras model order
+    """
+    GRAPH_OPTIMIZATION_LEVELS = {'disable': 'ORT_DISABLE_ALL', 'basic': 'ORT_ENABLE_BASIC',
+                                 'extended': 'ORT_ENABLE_EXTENDED', 'all': 'ORT_ENABLE_ALL'}
+
+    def __init__(self, model_path, intra_op_num_threads=1, graph_optimization_level='all'):
+        """
+        :param model_path: path to .onnx model
+        :param intra_op_num_threads: number of threads used within an operator, 0 lets onnxruntime decide
+        :param graph_optimization_level: 'disable', 'basic', 'extended' or 'all'
+        """
+        import onnxruntime
+
+        self.model_path = model_path
+
+        if graph_optimization_level not in self.GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError('unknown graph optimization level %s' % graph_optimization_level)
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_num_threads
+        options.graph_optimization_level = getattr(onnxruntime.GraphOptimizationLevel,
+                                                   self.GRAPH_OPTIMIZATION_LEVELS[graph_optimization_level])
+        self.session = onnxruntime.InferenceSession(model_path, sess_options=options,
+                                                    providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # dynamic dimensions are reported as names or None
+        height, width = model_input.shape[1:3]
+        self.fixed_size = (height, width) if isinstance(height, int) and isinstance(width, int) else None
+        self.quantized = False
+        # tf2onnx keeps the keras output order
+        self.output_names = [output.name for output in self.session.get_outputs()]
+
+    def weights_nbytes(self):
+        """
+        :return: size of the model file, whose initializers hold the weights
+        """
+        return os.path.getsize(self.model_path)
+
+    def __call__(self, im_tensor):
+        """
+        :param im_tensor: NHWC float32 batch
+        :return: list of NHWC numpy outputs, 3 per stride
+        """
+        return self.session.run(self.output_names,
+                                {self.input_name: np.ascontiguousarray(im_tensor, dtype=np.float32)})
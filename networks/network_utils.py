@@ -2,14 +2,21 @@ import tensorflow as tf
 import numpy as np
 
 
+MMAP_WEIGHTS_MAGIC = b'RFWMMAP1'
+MMAP_WEIGHTS_ALIGNMENT = 64
+
+
 def load_weights(weight_file):
     """
-    Load weights from npy file to map
+    Load weights from npy file to map. Files written by save_weights_mmap are memory mapped instead
 
-    :param weight_file: path to npy file
+    :param weight_file: path to npy file, or to memory mappable weights file
     :return: map layer_name -> map of weights
     """
     import numpy as np
+    with open(weight_file, 'rb') as f:
+        if f.read(len(MMAP_WEIGHTS_MAGIC)) == MMAP_WEIGHTS_MAGIC:
+            return load_weights_mmap(weight_file)
     try:
         weights_dict = np.load(weight_file, allow_pickle=True).item()
     except:
@@ -17,6 +24,145 @@ def load_weights(weight_file):
 
     return weights_dict
 
+def save_weights_mmap(weights_dict, weight_file):
+    """
+    Write a weights map to a flat memory mappable file: magic, little endian uint64 index length, json index,
+    then a single blob holding every array, each one aligned on MMAP_WEIGHTS_ALIGNMENT bytes.
+    The index maps layer_name -> key -> dtype, shape and blob offset of arrays, or the value of non array entries
+
+    :param weights_dict: map layer_name -> map of weights
+    :param weight_file: destination path
+    """
+    import json
+    import struct
+    index = {}
+    arrays = []
+    offset = 0
+    for name in sorted(weights_dict):
+        index[name] = {}
+        for key, value in weights_dict[name].items():
+            if not isinstance(value, np.ndarray):
+                index[name][key] = {"value": value}
+                continue
+            value = np.ascontiguousarray(value)
+            offset = -(-offset // MMAP_WEIGHTS_ALIGNMENT) * MMAP_WEIGHTS_ALIGNMENT
+            index[name][key] = {"dtype": value.dtype.str, "shape": list(value.shape), "offset": offset}
+            arrays.append((offset, value))
+            offset += value.nbytes
+    header = json.dumps(index).encode('utf-8')
+    blob_start = -(-(len(MMAP_WEIGHTS_MAGIC) + 8 + len(header)) // MMAP_WEIGHTS_ALIGNMENT) * MMAP_WEIGHTS_ALIGNMENT
+    header = header.ljust(blob_start - len(MMAP_WEIGHTS_MAGIC) - 8)
+    with open(weight_file, 'wb') as f:
+        f.write(MMAP_WEIGHTS_MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for array_offset, value in arrays:
+            f.seek(blob_start + array_offset)
+            f.write(value.tobytes())
+
+def load_weights_mmap(weight_file):
+    """
+    Map a file written by save_weights_mmap read only. Arrays are views of the mapped blob, so processes
+    loading the same file share its pages, and nothing is copied to the heap until it is used
+
+    :param weight_file: path to memory mappable weights file
+    :return: map layer_name -> map of read only weights
+    """
+    import json
+    import struct
+    with open(weight_file, 'rb') as f:
+        f.seek(len(MMAP_WEIGHTS_MAGIC))
+        header_length = struct.unpack('<Q', f.read(8))[0]
+        index = json.loads(f.read(header_length).decode('utf-8'))
+    blob_start = len(MMAP_WEIGHTS_MAGIC) + 8 + header_length
+    blob = np.memmap(weight_file, dtype=np.uint8, mode='r')
+    weights_dict = {}
+    for name, entries in index.items():
+        weights_dict[name] = {}
+        for key, entry in entries.items():
+            if "value" in entry:
+                weights_dict[name][key] = entry["value"]
+                continue
+            dtype = np.dtype(entry["dtype"])
+            start = blob_start + entry["offset"]
+            count = int(np.prod(entry["shape"]))
+            weights_dict[name][key] = np.frombuffer(blob, dtype=dtype, count=count, offset=start).reshape(entry["shape"])
+    return weights_dict
+
+def fuse_batch_normalization(weights_dict, variance_epsilon=1.9999999494757503e-05):
+    """
+    Fold inference batch normalizations into the weights of the convolution they follow.
+    A conv named x is followed by the BN named x_bn in the SSH head, resnet unit conv k by unit bn k+1,
+    and conv0 by bn0. Batch normalizations that do not follow a convolution are turned into a per channel
+    scale and offset
+
+    :param weights_dict: map layer_name -> map of weights, as returned by load_weights
+    :param variance_epsilon: epsilon of the batch normalization layers
+    :return: new weights map, folded BN entries are marked with key 'folded_into'
+    """
+    import re
+    if any("folded_into" in entry or "affine" in entry for entry in weights_dict.values()):
+        # already fused, e.g. by the memory mappable weights converter
+        return weights_dict
+    fused_dict = dict(weights_dict)
+    for name in weights_dict:
+        match = re.match(r'^(stage\d+_unit\d+_)conv(\d)$', name)
+        if match is not None:
+            bn_name = match.group(1) + 'bn' + str(int(match.group(2)) + 1)
+        elif name == 'conv0':
+            bn_name = 'bn0'
+        else:
+            bn_name = name + '_bn'
+        if "bn" in name or "weights" not in weights_dict[name] or bn_name not in weights_dict:
+            continue
+        scale, bias = _batch_normalization_affine(weights_dict[bn_name], variance_epsilon)
+        weights = weights_dict[name]["weights"].astype(np.float64)
+        conv_bias = weights_dict[name]["bias"].astype(np.float64) if "bias" in weights_dict[name] else 0.0
+        fused_dict[name] = {"weights": (weights * scale).astype(np.float32),
+                            "bias": (conv_bias * scale + bias).astype(np.float32)}
+        fused_dict[bn_name] = {"folded_into": name}
+
+    for name in weights_dict:
+        if "bn" in name and "folded_into" not in fused_dict[name]:
+            scale, bias = _batch_normalization_affine(weights_dict[name], variance_epsilon)
+            fused_dict[name] = {"affine": True, "scale": scale.astype(np.float32), "bias": bias.astype(np.float32)}
+    return fused_dict
+
+def _batch_normalization_affine(bn_weights, variance_epsilon):
+    """
+    Per channel scale and offset equivalent to an inference batch normalization
+
+    :param bn_weights: map of BN weights, mean, var and optional scale and bias
+    :param variance_epsilon: epsilon added to the variance
+    :return: tuple float64 scale, bias
+    """
+    mean = bn_weights["mean"].astype(np.float64)
+    gamma = bn_weights["scale"].astype(np.float64) if "scale" in bn_weights else np.ones(mean.shape)
+    beta = bn_weights["bias"].astype(np.float64) if "bias" in bn_weights else np.zeros(mean.shape)
+    scale = gamma / np.sqrt(bn_weights["var"].astype(np.float64) + variance_epsilon)
+    return scale, beta - mean * scale
+
+def sigmoid_score_head(weights_dict):
+    """
+    Turn the 2 class softmax score convolutions into face logit convolutions.
+    Score channels are [background anchors, face anchors], and a 2 way softmax is the sigmoid of the
+    face minus background logits, which is folded into the convolution weights
+
+    :param weights_dict: map layer_name -> map of weights, as returned by load_weights
+    :return: new weights map with the face_rpn_cls_score layers halved
+    """
+    sigmoid_dict = dict(weights_dict)
+    for name in weights_dict:
+        if not name.startswith("face_rpn_cls_score"):
+            continue
+        weights = weights_dict[name]["weights"]
+        A = weights.shape[3] // 2
+        sigmoid_dict[name] = {"weights": weights[:, :, :, A:] - weights[:, :, :, :A]}
+        if "bias" in weights_dict[name]:
+            bias = weights_dict[name]["bias"]
+            sigmoid_dict[name]["bias"] = bias[A:] - bias[:A]
+    return sigmoid_dict
+
 def load_weights_to_network(model, weights_dict):
     """
     load pretrained weights to tf keras model
@@ -28,7 +174,9 @@ def load_weights_to_network(model, weights_dict):
     weights_names = list(weights_dict.keys())
     for layer in model.layers:
         if layer.name in weights_names:
-            if "bn" in layer.name:
+            if "affine" in weights_dict[layer.name]:
+                layer.set_weights([weights_dict[layer.name]["scale"], weights_dict[layer.name]["bias"]])
+            elif "bn" in layer.name:
                 mean = weights_dict[layer.name]["mean"]
                 var = weights_dict[layer.name]["var"]
                 scale = weights_dict[layer.name]["scale"] if "scale" in weights_dict[layer.name] else np.ones(
@@ -54,6 +202,17 @@ def relu(input_tensor, name):
     return tf.keras.layers.ReLU(name=name)(input_tensor)
 
 
+def sigmoid(input_tensor, name):
+    """
+    Applies tf keras sigmoid activation
+
+    :param input_tensor:
+    :param name:
+    :return: sigmoid tensor applied to input
+    """
+    return tf.keras.layers.Activation('sigmoid', name=name)(input_tensor)
+
+
 def pad(input_tensor, paddings):
     """
     Applies tf keras zero padding, with paddding defined as image dimensions (2nd and 3rd)
@@ -68,6 +227,36 @@ def pad(input_tensor, paddings):
     return tf.keras.layers.ZeroPadding2D(padding=tuple(paddings[1]))(input_tensor)
 
 
+def preprocessing(input_tensor, size_tensor, pixel_means, pixel_stds, pixel_scale, name):
+    """
+    Converts a batch of raw uint8 BGR images into the float network input:
+    cast, channel reversal, bilinear resize, mean/std normalization,
+    then zero padding of height and width to the next multiple of 32
+
+    :param input_tensor: NHWC uint8 BGR images
+    :param size_tensor: int32 (height, width) resized sizes, one per image, the first one is applied to the whole
+        batch. Computed on the host, so that it matches the size the detections are clipped to
+    :param pixel_means: BGR means
+    :param pixel_stds: BGR stds
+    :param pixel_scale: pixel values are divided by this scale before normalization
+    :param name:
+    :return: NHWC float32 tensor
+    """
+    means = [float(m) for m in pixel_means[::-1]]
+    stds = [float(s) for s in pixel_stds[::-1]]
+
+    def _preprocess(inputs):
+        images, sizes = inputs
+        images = tf.reverse(tf.cast(images, tf.float32), axis=[3])
+        size = sizes[0]
+        images = tf.image.resize(images, size, method='bilinear')
+        images = (images / pixel_scale - means) / stds
+        padded_size = (size + 31) // 32 * 32
+        return tf.pad(images, [[0, 0], [0, padded_size[0] - size[0]], [0, padded_size[1] - size[1]], [0, 0]])
+
+    return tf.keras.layers.Lambda(_preprocess, name=name)([input_tensor, size_tensor])
+
+
 def convolution(input_tensor, weights_dict, strides, padding, name):
     """
     Applies tf keras conv2D, with conv parameters defined by weights shape
@@ -90,15 +279,36 @@ def convolution(input_tensor, weights_dict, strides, padding, name):
     return layer
 
 
-def batch_normalization(input_tensor, variance_epsilon, name):
+class ChannelAffine(tf.keras.layers.Layer):
+    """
+    Per channel scale and offset, the inference form of a batch normalization that can't be folded into a convolution
+    """
+    def build(self, input_shape):
+        channels = int(input_shape[-1])
+        self.scale = self.add_weight(name='scale', shape=(channels,), initializer='ones', trainable=False)
+        self.bias = self.add_weight(name='bias', shape=(channels,), initializer='zeros', trainable=False)
+        super(ChannelAffine, self).build(input_shape)
+
+    def call(self, inputs):
+        return inputs * self.scale + self.bias
+
+
+def batch_normalization(input_tensor, variance_epsilon, name, weights_dict=None):
     """
-    Appies tf keras BN layer
+    Appies tf keras BN layer.
+    If weights_dict comes from fuse_batch_normalization, folded BNs are skipped and the others are applied as
+    per channel affine layers
 
     :param input_tensor:
     :param variance_epsilon: epsilon to add to variance vector to avoid division by 0
     :param name:
+    :param weights_dict: optional weights of all model
     :return: BN tensor
     """
+    if weights_dict is not None and "folded_into" in weights_dict[name]:
+        return input_tensor
+    if weights_dict is not None and "affine" in weights_dict[name]:
+        return ChannelAffine(name=name)(input_tensor)
     return tf.keras.layers.BatchNormalization(epsilon=variance_epsilon, name=name, trainable=False)(input_tensor)
 
 # @staticmethod
@@ -153,7 +363,7 @@ def reshape_mxnet_1(input_tensor, name):
 
 def reshape_mxnet_2(input_tensor, name):
     input_shape = [tf.shape(input_tensor)[k] for k in range(4)]
-    sz = tf.dtypes.cast(input_shape[1] / 2, dtype=tf.int32)
+    sz = input_shape[1] // 2
     inter_1 = input_tensor[:, 0:sz, :, 0]
     inter_2 = input_tensor[:, 0:sz, :, 1]
     inter_3 = input_tensor[:, sz:, :, 0]
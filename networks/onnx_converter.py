@@ -0,0 +1,24 @@
+import tensorflow as tf
+
+
+def convert_to_onnx(model, size=None, batch_size=None, opset=13):
+    """
+    Convert a RetinaFace keras model to ONNX with tf2onnx, keeping the order of the 9 model outputs
+
+    :param model: tf.keras.models.Model with a NHWC float32 input
+    :param size: input size, int or (height, width), or None to keep height and width dynamic
+    :param batch_size: input batch size, or None for a dynamic batch
+    :param opset: ONNX opset version
+    :return: onnx.ModelProto
+    """
+    import tf2onnx
+
+    if size is None:
+        shape = [batch_size, None, None, 3]
+    else:
+        size = (size, size) if isinstance(size, int) else tuple(size)
+        shape = [batch_size, size[0], size[1], 3]
+    function = tf.function(lambda data: model(data, training=False))
+    model_proto, _ = tf2onnx.convert.from_function(
+        function, input_signature=(tf.TensorSpec(shape=shape, dtype=tf.float32, name='data'),), opset=opset)
+    return model_proto
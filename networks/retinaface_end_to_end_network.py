@@ -0,0 +1,148 @@
+import tensorflow as tf
+import numpy as np
+from rcnn.processing.generate_anchor import anchors_plane
+
+
+class RetinaFaceEndToEndNetwork(object):
+    """
+    RetinaFace network of fixed input size, with anchor decoding, score thresholding and NMS done in the graph.
+    Wraps an already loaded RetinaFace keras model, whose 9 outputs are decoded against constant anchor tensors.
+    Size must be a multiple of 32
+    The model takes a NHWC float32 batch of images zero padded to size, and an im_info [N, 2] float32 batch of the
+    height and width of each image before padding. Detections are clipped to, and anchors masked outside of, the
+    unpadded image. It returns, padded to max_detections:
+    boxes [N, max_detections, 4], scores [N, max_detections], landmarks [N, max_detections, 5, 2] and valid_count [N].
+    Coordinates are in input pixels and should be divided by the image resizing scale
+    """
+    def __init__(self, model, anchors_fpn, feat_stride_fpn, size, score_threshold=0.5, nms_threshold=0.4,
+                 max_detections=100, pre_nms_topk=5000):
+        """
+        :param model: RetinaFace keras model with float32 input, as built by RetinaFaceNetwork
+        :param anchors_fpn: map 'stride%s' -> [A 4] base anchors
+        :param feat_stride_fpn: strides, in the order of the model outputs
+        :param size: input size, int or (height, width)
+        :param score_threshold: detection threshold
+        :param nms_threshold: nms threshold
+        :param max_detections: number of detections returned per image
+        :param pre_nms_topk: number of highest scoring anchors kept before nms
+        """
+        self.size = (size, size) if isinstance(size, int) else tuple(size)
+        assert self.size[0]%32==0 and self.size[1]%32==0
+        self.backbone = model
+        self.anchors_fpn = anchors_fpn
+        self.feat_stride_fpn = feat_stride_fpn
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        self.max_detections = max_detections
+        self.pre_nms_topk = pre_nms_topk
+        self.model = self.load_model()
+
+    def load_model(self):
+        """
+        Define network structure, with decoding and nms appended to the backbone outputs
+        :return: tf.keras.models.Model
+        """
+        data = tf.keras.Input(dtype=tf.float32, shape=(self.size[0], self.size[1], 3), name='data')
+        im_info = tf.keras.Input(dtype=tf.float32, shape=(2,), name='im_info')
+        net_out = self.backbone(data)
+        detections = tf.keras.layers.Lambda(lambda inputs: self.decode(inputs[:-1], inputs[-1]),
+                                            name='detections')(list(net_out) + [im_info])
+        return tf.keras.models.Model(inputs=[data, im_info], outputs=detections)
+
+    def get_anchors(self, stride):
+        """
+        Constant anchor plane of a stride, as widths, heights and centers
+        :param stride: feature map stride
+        :return: [K*A 4] float32 array of widths, heights, ctr_x, ctr_y
+        """
+        height = self.size[0] // stride
+        width = self.size[1] // stride
+        anchors_fpn = self.anchors_fpn['stride%s'%stride]
+        anchors = anchors_plane(height, width, stride, anchors_fpn).reshape((-1, 4)).astype(np.float64)
+        widths = anchors[:, 2] - anchors[:, 0] + 1.0
+        heights = anchors[:, 3] - anchors[:, 1] + 1.0
+        ctr_x = anchors[:, 0] + 0.5 * (widths - 1.0)
+        ctr_y = anchors[:, 1] + 0.5 * (heights - 1.0)
+        return np.stack([widths, heights, ctr_x, ctr_y], axis=1).astype(np.float32)
+
+    def get_cells(self, stride):
+        """
+        Feature map cell of every anchor of a stride, in the order of get_anchors
+        :param stride: feature map stride
+        :return: [K*A 2] float32 array of cell rows, columns
+        """
+        height = self.size[0] // stride
+        width = self.size[1] // stride
+        A = self.anchors_fpn['stride%s'%stride].shape[0]
+        rows = np.repeat(np.arange(height), width * A)
+        cols = np.tile(np.repeat(np.arange(width), A), height)
+        return np.stack([rows, cols], axis=1).astype(np.float32)
+
+    def decode(self, net_out, im_info):
+        """
+        Decode the 9 network outputs into padded detections
+        :param net_out: list of NHWC outputs, cls/bbox/landmark per stride
+        :param im_info: [N 2] height and width of the images before padding
+        :return: tuple boxes, scores, landmarks, valid_count
+        """
+        # boxes are clipped to the unpadded images, like clip_boxes does in RetinaFace._postprocess
+        max_xy = tf.tile(im_info[:, ::-1] - 1.0, [1, 2])[:, tf.newaxis, :]
+        scores_list = []
+        boxes_list = []
+        landmarks_list = []
+        for idx, stride in enumerate(self.feat_stride_fpn):
+            A = self.anchors_fpn['stride%s'%stride].shape[0]
+            cls_prob, bbox_deltas, landmark_deltas = net_out[3 * idx:3 * idx + 3]
+            batch_size = tf.shape(cls_prob)[0]
+            anchors = tf.constant(self.get_anchors(stride))
+            widths, heights, ctr_x, ctr_y = [anchors[:, k] for k in range(4)]
+
+            # anchors of the cells covering the padding only are masked, as in RetinaFace._postprocess
+            cells = tf.constant(self.get_cells(stride))
+            valid_cells = tf.math.ceil(im_info / stride)
+            valid = tf.reduce_all(cells[tf.newaxis] < valid_cells[:, tf.newaxis], axis=2)
+            scores = tf.reshape(cls_prob[:, :, :, -A:], [batch_size, -1])
+            scores_list.append(tf.where(valid, scores, -1.0))
+
+            bbox_deltas = tf.reshape(bbox_deltas, [batch_size, -1, 4])
+            pred_ctr_x = bbox_deltas[:, :, 0] * widths + ctr_x
+            pred_ctr_y = bbox_deltas[:, :, 1] * heights + ctr_y
+            pred_w = tf.exp(bbox_deltas[:, :, 2]) * widths
+            pred_h = tf.exp(bbox_deltas[:, :, 3]) * heights
+            boxes = tf.stack([pred_ctr_x - 0.5 * (pred_w - 1.0),
+                              pred_ctr_y - 0.5 * (pred_h - 1.0),
+                              pred_ctr_x + 0.5 * (pred_w - 1.0),
+                              pred_ctr_y + 0.5 * (pred_h - 1.0)], axis=2)
+            boxes_list.append(tf.minimum(tf.maximum(boxes, 0.0), max_xy))
+
+            landmark_deltas = tf.reshape(landmark_deltas, [batch_size, -1, 5, 2])
+            landmarks = tf.stack([landmark_deltas[:, :, :, 0] * widths[:, tf.newaxis] + ctr_x[:, tf.newaxis],
+                                  landmark_deltas[:, :, :, 1] * heights[:, tf.newaxis] + ctr_y[:, tf.newaxis]], axis=3)
+            landmarks_list.append(landmarks)
+
+        scores = tf.concat(scores_list, axis=1)
+        boxes = tf.concat(boxes_list, axis=1)
+        landmarks = tf.concat(landmarks_list, axis=1)
+        return tf.map_fn(self.nms, (boxes, scores, landmarks),
+                         fn_output_signature=(tf.float32, tf.float32, tf.float32, tf.int32))
+
+    def nms(self, detections):
+        """
+        Top k selection and nms of the decoded anchors of one image
+        :param detections: tuple [M 4] boxes, [M] scores, [M 5 2] landmarks
+        :return: tuple boxes, scores, landmarks padded to max_detections, valid_count
+        """
+        boxes, scores, landmarks = detections
+        topk = tf.minimum(self.pre_nms_topk, tf.shape(scores)[0])
+        scores, order = tf.math.top_k(scores, k=topk)
+        boxes = tf.gather(boxes, order)
+        landmarks = tf.gather(landmarks, order)
+        keep, valid_count = tf.image.non_max_suppression_padded(boxes, scores, self.max_detections,
+                                                                iou_threshold=self.nms_threshold,
+                                                                score_threshold=self.score_threshold,
+                                                                pad_to_max_output_size=True)
+        valid = tf.sequence_mask(valid_count, self.max_detections)
+        boxes = tf.where(valid[:, tf.newaxis], tf.gather(boxes, keep), 0.0)
+        scores = tf.where(valid, tf.gather(scores, keep), 0.0)
+        landmarks = tf.where(valid[:, tf.newaxis, tf.newaxis], tf.gather(landmarks, keep), 0.0)
+        return boxes, scores, landmarks, valid_count
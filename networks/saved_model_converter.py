@@ -0,0 +1,19 @@
+import tensorflow as tf
+
+
+def convert_to_saved_model(model, export_dir):
+    """
+    Export a RetinaFace keras model to a SavedModel, as a single traced function with dynamic batch, height and
+    width. Loading it with tf.saved_model.load restores the graph and variables directly, without rebuilding
+    the keras layers in python
+
+    :param model: tf.keras.models.Model with a NHWC float32 input
+    :param export_dir: SavedModel directory
+    """
+    module = tf.Module()
+    # only the variables are tracked, restoring the keras model object would rebuild its layers on load
+    module.variables_list = list(model.variables)
+    module.serve = tf.function(lambda data: model(data, training=False),
+                               input_signature=[tf.TensorSpec(shape=[None, None, None, 3], dtype=tf.float32,
+                                                              name='data')])
+    tf.saved_model.save(module, export_dir, signatures=module.serve)
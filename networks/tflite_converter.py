@@ -0,0 +1,29 @@
+import tensorflow as tf
+
+
+def convert_to_tflite(model, size=None, batch_size=1, representative_dataset=None):
+    """
+    Convert a RetinaFace keras model to a TFLite flatbuffer
+
+    :param model: tf.keras.models.Model with a NHWC float32 input
+    :param size: input size, int or (height, width), or None to keep height and width dynamic
+    :param batch_size: input batch size
+    :param representative_dataset: optional generator of [NHWC float32 batch] lists, enables full integer
+        int8 quantization calibrated on these inputs
+    :return: bytes of the .tflite model
+    """
+    if size is None:
+        shape = [batch_size, None, None, 3]
+    else:
+        size = (size, size) if isinstance(size, int) else tuple(size)
+        shape = [batch_size, size[0], size[1], 3]
+    concrete_function = tf.function(lambda data: model(data, training=False)).get_concrete_function(
+        tf.TensorSpec(shape=shape, dtype=tf.float32, name='data'))
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_function])
+    if representative_dataset is not None:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    return converter.convert()
@@ -14,7 +14,7 @@ cdef inline np.float32_t max(np.float32_t a, np.float32_t b):
 cdef inline np.float32_t min(np.float32_t a, np.float32_t b):
     return a if a <= b else b
 
-def cpu_nms(np.ndarray[np.float32_t, ndim=2] dets, np.float thresh):
+def cpu_nms(np.ndarray[np.float32_t, ndim=2] dets, float thresh, int max_keep=0):
     cdef np.ndarray[np.float32_t, ndim=1] x1 = dets[:, 0]
     cdef np.ndarray[np.float32_t, ndim=1] y1 = dets[:, 1]
     cdef np.ndarray[np.float32_t, ndim=1] x2 = dets[:, 2]
@@ -22,11 +22,11 @@ def cpu_nms(np.ndarray[np.float32_t, ndim=2] dets, np.float thresh):
     cdef np.ndarray[np.float32_t, ndim=1] scores = dets[:, 4]
 
     cdef np.ndarray[np.float32_t, ndim=1] areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-    cdef np.ndarray[np.int_t, ndim=1] order = scores.argsort()[::-1]
+    cdef np.ndarray[np.intp_t, ndim=1] order = scores.argsort()[::-1]
 
     cdef int ndets = dets.shape[0]
-    cdef np.ndarray[np.int_t, ndim=1] suppressed = \
-            np.zeros((ndets), dtype=np.int)
+    cdef np.ndarray[np.intp_t, ndim=1] suppressed = \
+            np.zeros((ndets), dtype=np.intp)
 
     # nominal indices
     cdef int _i, _j
@@ -45,6 +45,9 @@ def cpu_nms(np.ndarray[np.float32_t, ndim=2] dets, np.float thresh):
         if suppressed[i] == 1:
             continue
         keep.append(i)
+        # early stop once max_keep boxes are kept, the remaining ones would be dropped anyway
+        if max_keep > 0 and len(keep) >= max_keep:
+            break
         ix1 = x1[i]
         iy1 = y1[i]
         ix2 = x2[i]
@@ -7,32 +7,36 @@ except ImportError:
 
 
 def py_nms_wrapper(thresh):
-    def _nms(dets):
-        return nms(dets, thresh)
+    def _nms(dets, max_keep=0):
+        return nms(dets, thresh, max_keep)
     return _nms
 
 
 def cpu_nms_wrapper(thresh):
-    def _nms(dets):
+    def _nms(dets, max_keep=0):
+        if max_keep > 0:
+            return cpu_nms(dets, thresh, max_keep)
         return cpu_nms(dets, thresh)
     return _nms
 
 
 def gpu_nms_wrapper(thresh, device_id):
-    def _nms(dets):
-        return gpu_nms(dets, thresh, device_id)
+    def _nms(dets, max_keep=0):
+        keep = gpu_nms(dets, thresh, device_id)
+        return keep[:max_keep] if max_keep > 0 else keep
     if gpu_nms is not None:
         return _nms
     else:
         return cpu_nms_wrapper(thresh)
 
 
-def nms(dets, thresh):
+def nms(dets, thresh, max_keep=0):
     """
     greedily select boxes with high confidence and overlap with current maximum <= thresh
     rule out overlap >= thresh
     :param dets: [[x1, y1, x2, y2 score]]
     :param thresh: retain overlap < thresh
+    :param max_keep: stop once this many boxes are kept, 0 for no limit
     :return: indexes to keep
     """
     x1 = dets[:, 0]
@@ -48,6 +52,8 @@ def nms(dets, thresh):
     while order.size > 0:
         i = order[0]
         keep.append(i)
+        if max_keep > 0 and len(keep) >= max_keep:
+            break
         xx1 = np.maximum(x1[i], x1[order[1:]])
         yy1 = np.maximum(y1[i], y1[order[1:]])
         xx2 = np.minimum(x2[i], x2[order[1:]])
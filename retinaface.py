@@ -1,13 +1,93 @@
 from __future__ import print_function
+from collections import OrderedDict
+import threading
+import queue
 import numpy as np
 import cv2
 from rcnn.processing.bbox_transform import clip_boxes
 from rcnn.processing.generate_anchor import generate_anchors_fpn, anchors_plane
 from rcnn.processing.nms import gpu_nms_wrapper, cpu_nms_wrapper
-from networks.retinaface_network import RetinaFaceNetwork
+from networks.backends import TFLiteBackend, SavedModelBackend, OnnxRuntimeBackend
+try:
+    import tensorflow as tf
+    from networks.retinaface_network import RetinaFaceNetwork
+    from networks.retinaface_end_to_end_network import RetinaFaceEndToEndNetwork
+except ImportError:
+    # the onnx backend runs without tensorflow
+    tf = None
+
+class DetectStream(object):
+    """
+    Running RetinaFace.detect_stream pipeline, iterating its results. Closing it, or dropping it, stops its threads
+    """
+    def __init__(self, queues, results):
+        """
+        :param queues: OrderedDict queue name -> queue.Queue of the pipeline
+        :param results: generator of the results of the pipeline
+        """
+        self.queues = queues
+        self.results = results
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.results)
+
+    def close(self):
+        """
+        Stop the pipeline
+        """
+        self.results.close()
+
+    def queue_depths(self):
+        """
+        Current depths of the pipeline queues
+        :return: dict queue name -> number of queued items
+        """
+        return OrderedDict((name, q.qsize()) for name, q in self.queues.items())
+
 
 class RetinaFace:
-    def __init__(self, model_weights, use_gpu_nms=True, nms=0.4, decay4=0.5):
+    def __init__(self, model_weights, use_gpu_nms=True, nms=0.4, decay4=0.5, bucket_sizes=None,
+                 anchor_cache_size=16, reuse_input_buffer=False, in_graph_preprocess=False,
+                 fuse_bn=False, sigmoid_scores=False, backend='keras', num_threads=1, input_size=None,
+                 graph_optimization_level='all', target_size=1024, max_size=1980, min_face_size=None,
+                 pre_nms_topk=None, max_detections=None):
+        """
+        :param model_weights: path to npy weights file, or to the exported model of a non keras backend
+        :param use_gpu_nms: whether to use gpu for nms
+        :param nms: nms threshold
+        :param decay4: score decay of stride 4 anchors
+        :param bucket_sizes: sorted list of input heights/widths the batches are padded to, so that the
+            compiled inference function is traced once per bucket. Sizes beyond the last bucket, or all sizes
+            if None, are padded to the next multiple of 32
+        :param anchor_cache_size: number of (height, width, stride) anchor planes kept in the LRU anchor cache,
+            keyed by the padded feature map shape of the input bucket. 0 disables the cache
+        :param reuse_input_buffer: keep the NHWC input batch allocated between calls and fill it in place.
+            The detector must then not be called concurrently
+        :param in_graph_preprocess: feed raw uint8 BGR images and their resized size to the network, and do the
+            resizing and normalization as TF ops. Images of a batch sharing shape and scale are run together.
+            The TF bilinear resize is close to, but not bit exact with, cv2.resize
+        :param fuse_bn: fold batch normalizations into the convolution weights when building the network
+        :param sigmoid_scores: build the network with sigmoid score heads that only output face probabilities
+        :param backend: 'keras' to build the network from npy weights, 'tflite' to run an exported .tflite model,
+            'int8' to run a full integer quantized .tflite model made by calibrate_int8.py,
+            'onnx' to run an exported .onnx model with onnxruntime, 'saved_model' to load a SavedModel exported by
+            export_saved_model.py, which skips building the network in python and starts much faster
+        :param num_threads: number of CPU threads of the tflite interpreter, or onnxruntime intra op threads
+        :param input_size: fixed (height, width) input, images are resized to fit in it and padded to it.
+            Taken from the model with fixed size tflite and onnx models
+        :param graph_optimization_level: onnxruntime graph optimizations, 'disable', 'basic', 'extended' or 'all'
+        :param target_size: size the short side of images is resized to
+        :param max_size: maximum size of the long side of resized images
+        :param min_face_size: if set, images are instead resized so that faces of this size, in input image pixels,
+            match the smallest anchor. Small inputs are then downscaled rather than upscaled to target_size
+        :param pre_nms_topk: maximum number of proposals per image going through nms, the best scoring ones.
+            None keeps all the proposals above the threshold
+        :param max_detections: maximum number of faces returned per image, nms stops once they are kept.
+            None for no limit
+        """
         self.decay4 = decay4
         self.nms_threshold = nms
         self.fpn_keys = []
@@ -37,102 +117,828 @@ class RetinaFace:
         self.pixel_means = np.array(pixel_means, dtype=np.float32)
         self.pixel_stds = np.array(pixel_stds, dtype=np.float32)
         self.pixel_scale = float(pixel_scale)
+        # normalization folded into a single multiply-add on RGB ordered channels
+        self._pixel_mul = (1.0 / (self.pixel_scale * self.pixel_stds[::-1])).astype(np.float32)
+        self._pixel_add = (-self.pixel_means[::-1] / self.pixel_stds[::-1]).astype(np.float32)
         self.bbox_stds = [1.0, 1.0, 1.0, 1.0]
-        self.scales = [1024, 1980]
-        self.model = RetinaFaceNetwork(model_weights).model
+        self.scales = [target_size, max_size]
+        self.min_face_size = min_face_size
+        self.pre_nms_topk = pre_nms_topk
+        self.max_detections = max_detections
+        # the smallest faces the network detects are the size of its smallest anchors, 16px at stride 8
+        self.min_anchor_size = min(float(np.min(anchors[:, 2] - anchors[:, 0] + 1))
+                                   for anchors in self._anchors_fpn.values())
+        self.bucket_sizes = sorted(bucket_sizes) if bucket_sizes is not None else []
+        self.anchor_cache_size = anchor_cache_size
+        self._anchor_cache = OrderedDict()
+        # the detect_stream postprocessing workers share the anchor cache
+        self._anchor_cache_lock = threading.Lock()
+        self.reuse_input_buffer = reuse_input_buffer
+        self._input_buffer = None
+        self.in_graph_preprocess = in_graph_preprocess
+        self.backend = backend
+        self.model = None
+        self.inference_backend = None
+        # fixed (height, width) input of the backend, images are resized to fit in it
+        self.input_size = tuple(input_size) if input_size is not None else None
+        if tf is None and backend in ('keras', 'tflite', 'int8', 'saved_model'):
+            raise ImportError('the %s backend requires tensorflow, only the onnx backend runs without it' % backend)
+        if backend == 'keras':
+            self.model = RetinaFaceNetwork(model_weights, raw_input=in_graph_preprocess, pixel_means=pixel_means,
+                                           pixel_stds=pixel_stds, pixel_scale=pixel_scale, fuse_bn=fuse_bn,
+                                           sigmoid_scores=sigmoid_scores, release_weights=True).model
+        elif backend in ('tflite', 'int8'):
+            self.inference_backend = TFLiteBackend(model_weights, num_threads=num_threads)
+            if self.inference_backend.quantized != (backend == 'int8'):
+                raise ValueError('%s is not a %s model' % (model_weights,
+                                 'full integer quantized' if backend == 'int8' else 'float tflite'))
+        elif backend == 'saved_model':
+            self.inference_backend = SavedModelBackend(model_weights)
+        elif backend == 'onnx':
+            self.inference_backend = OnnxRuntimeBackend(model_weights, intra_op_num_threads=num_threads,
+                                                        graph_optimization_level=graph_optimization_level)
+        else:
+            raise ValueError('unknown backend %s' % backend)
+        if self.inference_backend is not None and self.inference_backend.fixed_size is not None:
+            self.input_size = self.inference_backend.fixed_size
+        if in_graph_preprocess and backend != 'keras':
+            raise ValueError('in graph preprocessing is only available with the keras backend')
+        if backend != 'keras':
+            self._infer = None
+        elif in_graph_preprocess:
+            # raw image sizes are not bucketed, so a single shape agnostic graph is traced
+            self._infer = tf.function(self._infer_fn, input_signature=[(
+                tf.TensorSpec(shape=(None, None, None, 3), dtype=tf.uint8),
+                tf.TensorSpec(shape=(None, 2), dtype=tf.int32))])
+        else:
+            self._infer = tf.function(self._infer_fn)
+        self.trace_count = 0
+        self.infer_calls = 0
 
-    def detect(self, img, threshold=0.5):
+    def detect(self, img, threshold=0.5, target_size=None, max_size=None, min_face_size=None):
         """
         Detect all the faces and landmarks in an image
         :param img: input image
         :param threshold: detection threshold
+        :param target_size: overrides the detector target_size for this call
+        :param max_size: overrides the detector max_size for this call
+        :param min_face_size: overrides the detector min_face_size for this call
         :return: tuple faces, landmarks
         """
-        proposals_list = []
-        scores_list = []
+        return self.detect_batch([img], threshold, target_size, max_size, min_face_size)[0]
+
+    def detect_batch(self, images, threshold=0.5, target_size=None, max_size=None, min_face_size=None):
+        """
+        Detect all the faces and landmarks in a list of images with a single forward pass.
+        Every image is resized with its own scale, then images are zero padded to a common size.
+        Detections close to the padded borders may differ slightly from the ones returned by detect
+        :param images: list of input images
+        :param threshold: detection threshold, or list of thresholds, one per image
+        :param target_size: overrides the detector target_size for this call
+        :param max_size: overrides the detector max_size for this call
+        :param min_face_size: overrides the detector min_face_size for this call
+        :return: list of tuples faces, landmarks, one per image
+        """
+        thresholds = threshold if isinstance(threshold, (list, tuple)) else [threshold] * len(images)
+        im_scales = [self._get_scale(img.shape, target_size, max_size, min_face_size) for img in images]
+        return self._detect_scaled(images, im_scales, thresholds)
+
+    def detect_batch_scaled(self, images, im_scales, threshold=0.5):
+        """
+        Detect all the faces and landmarks in a list of images with a single forward pass, each image being
+        resized with a scale chosen by the caller instead of target_size and max_size
+        :param images: list of input images
+        :param im_scales: list of resizing scales, one per image
+        :param threshold: detection threshold, or list of thresholds, one per image
+        :return: list of tuples faces, landmarks, one per image
+        """
+        thresholds = threshold if isinstance(threshold, (list, tuple)) else [threshold] * len(images)
+        return self._detect_scaled(images, im_scales, thresholds)
+
+    def preprocess_batch(self, images, target_size=None, max_size=None, min_face_size=None):
+        """
+        Resize, normalize and pad images into the NHWC network input batch exactly as detect_batch does,
+        e.g. for int8 calibration
+        :param images: list of input images
+        :param target_size: overrides the detector target_size for this call
+        :param max_size: overrides the detector max_size for this call
+        :param min_face_size: overrides the detector min_face_size for this call
+        :return: tuple NHWC float32 batch, list of resized image sizes, list of resizing scales
+        """
+        if self.in_graph_preprocess:
+            raise ValueError('the network input is the raw images with in_graph_preprocess')
+        im_scales = [self._get_scale(img.shape, target_size, max_size, min_face_size) for img in images]
+        im_tensor, im_infos = self._preprocess_batch(images, im_scales)
+        return im_tensor, im_infos, im_scales
+
+    def _detect_scaled(self, images, im_scales, thresholds):
+        """
+        Detect the faces of a batch of images resized with the given scales, in a single forward pass
+        :param images: list of input images
+        :param im_scales: list of resizing scales, one per image
+        :param thresholds: list of detection thresholds, one per image
+        :return: list of tuples faces, landmarks, one per image
+        """
+        if not images:
+            # e.g. a batch emptied by cancelled requests
+            return []
+        if self.in_graph_preprocess:
+            return self._detect_batch_raw(images, im_scales, thresholds)
+        im_tensor, im_infos = self._preprocess_batch(images, im_scales)
+        net_out = self._forward(im_tensor)
+
+        return [self._postprocess(net_out, i, im_infos[i], im_scales[i], thresholds[i]) for i in range(len(images))]
+
+    def detect_rois(self, img, rois, threshold=0.5, expand=0.5, roi_size=128):
+        """
+        Detect the faces of an image inside known regions only, such as the faces of the previous frame or the
+        person boxes of an upstream detector. Each region is expanded, cropped and resized so that its expanded
+        long side is roi_size, and all the crops are run in a single forward pass. Detections are shifted back to
+        image coordinates and merged with a single global nms.
+        Faces are found when they are larger than the smallest anchor (16px) once resized, so roi_size should be
+        at least 16 / (face size relative to the expanded region long side)
+        :param img: input image
+        :param rois: [N 4] regions x1, y1, x2, y2 in image coordinates, extra columns such as scores are ignored
+        :param threshold: detection threshold
+        :param expand: margin added around each region on every side, relative to its size
+        :param roi_size: long side of the expanded regions once resized
+        :return: tuple faces, landmarks
+        """
+        height, width = img.shape[0], img.shape[1]
+        crops = []
+        offsets = []
+        im_scales = []
+        for roi in rois:
+            w = roi[2] - roi[0] + 1
+            h = roi[3] - roi[1] + 1
+            if w < 1 or h < 1:
+                continue
+            x0 = int(max(0, np.floor(roi[0] - expand * w)))
+            y0 = int(max(0, np.floor(roi[1] - expand * h)))
+            x1 = int(min(width, np.ceil(roi[2] + expand * w) + 1))
+            y1 = int(min(height, np.ceil(roi[3] + expand * h) + 1))
+            if x1 <= x0 or y1 <= y0:
+                continue
+            # the scale follows the expanded region before clipping, so regions on the image borders are not
+            # zoomed in further
+            im_scale = float(roi_size) / ((1 + 2 * expand) * max(w, h))
+            if self.input_size is not None:
+                im_scale = min(im_scale, float(self.input_size[0]) / (y1 - y0), float(self.input_size[1]) / (x1 - x0))
+            crops.append(img[y0:y1, x0:x1])
+            offsets.append((x0, y0))
+            im_scales.append(im_scale)
+        if not crops:
+            return np.zeros((0, 5)), np.zeros((0, 5, 2))
+        results = self._detect_scaled(crops, im_scales, [threshold] * len(crops))
+
+        faces_list = []
         landmarks_list = []
+        for (x0, y0), (faces, landmarks) in zip(offsets, results):
+            if faces.shape[0] == 0:
+                continue
+            faces = faces.copy()
+            faces[:, 0:4] += [x0, y0, x0, y0]
+            faces_list.append(faces)
+            landmarks_list.append(landmarks + np.array([x0, y0], dtype=landmarks.dtype))
+        if not faces_list:
+            return np.zeros((0, 5)), np.zeros((0, 5, 2))
+        faces = np.vstack(faces_list)
+        landmarks = np.vstack(landmarks_list)
+        order = faces[:, 4].argsort()[::-1]
+        faces = faces[order]
+        landmarks = landmarks[order]
+        keep = self._nms(faces[:, 0:5].astype(np.float32))
+        return faces[keep], landmarks[keep]
+
+    def detect_tiled(self, img, tile_size=1024, overlap=128, threshold=0.5, batch_size=4):
+        """
+        Detect the faces of a large image at its native resolution, by cutting it into overlapping tiles that
+        are run through the network in batches. Detections are shifted back to image coordinates and merged with
+        a single global nms. A face cut by a tile edge is dropped when it is smaller than the overlap, as it then
+        lies entirely in a neighbouring tile. Larger cut faces are merged with the overlapping parts of
+        themselves found in the other tiles, into their union box, before the nms.
+        The image can be a read only np.memmap (see np.lib.format.open_memmap), only the tiles being detected
+        are read into memory
+        :param img: HWC BGR image or memory mapped array
+        :param tile_size: tile height and width, int or (height, width)
+        :param overlap: overlap between neighbouring tiles, in pixels
+        :param threshold: detection threshold
+        :param batch_size: number of tiles per forward pass
+        :return: tuple faces, landmarks
+        """
+        tile_h, tile_w = (tile_size, tile_size) if isinstance(tile_size, int) else tuple(tile_size)
+        if overlap >= min(tile_h, tile_w):
+            raise ValueError('overlap must be smaller than the tile size')
+        if self.input_size is not None and (tile_h > self.input_size[0] or tile_w > self.input_size[1]):
+            raise ValueError('tiles must fit in the %sx%s model input' % self.input_size)
+        height, width = img.shape[0], img.shape[1]
+        ys = self._tile_starts(height, tile_h, overlap)
+        xs = self._tile_starts(width, tile_w, overlap)
+        tiles = [(y0, x0) for y0 in ys for x0 in xs]
 
-        im_shape = img.shape
-        target_size = self.scales[0]
-        max_size = self.scales[1]
+        faces_list = []
+        landmarks_list = []
+        cut_list = []
+        for i in range(0, len(tiles), batch_size):
+            batch = tiles[i:i + batch_size]
+            images = [np.ascontiguousarray(img[y0:y0 + tile_h, x0:x0 + tile_w]) for y0, x0 in batch]
+            results = self._detect_scaled(images, [1.0] * len(images), [threshold] * len(images))
+            for (y0, x0), tile, (faces, landmarks) in zip(batch, images, results):
+                if faces.shape[0] == 0:
+                    continue
+                keep, cut = self._tile_edges(faces, tile.shape, y0, x0, height, width, overlap)
+                faces = faces[keep]
+                faces[:, 0:4] += [x0, y0, x0, y0]
+                landmarks = landmarks[keep] + np.array([x0, y0], dtype=landmarks.dtype)
+                faces_list.append(faces)
+                landmarks_list.append(landmarks)
+                cut_list.append(cut[keep])
+
+        if not faces_list:
+            return np.zeros((0, 5)), np.zeros((0, 5, 2))
+        faces = np.vstack(faces_list)
+        landmarks = np.vstack(landmarks_list)
+        cut = np.concatenate(cut_list)
+        if cut.any():
+            cut_faces, cut_landmarks = self._merge_cut_faces(faces[cut], landmarks[cut])
+            faces = np.vstack([faces[~cut], cut_faces])
+            landmarks = np.vstack([landmarks[~cut], cut_landmarks])
+        order = faces[:, 4].argsort()[::-1]
+        faces = faces[order]
+        landmarks = landmarks[order]
+        keep = self._nms(faces[:, 0:5].astype(np.float32))
+        return faces[keep], landmarks[keep]
+
+    @staticmethod
+    def _tile_starts(size, tile, overlap):
+        """
+        Start offsets of the tiles covering an image dimension, the last tile being aligned on the image end
+        :param size: image height or width
+        :param tile: tile height or width
+        :param overlap: overlap between neighbouring tiles
+        :return: list of offsets
+        """
+        if size <= tile:
+            return [0]
+        starts = list(range(0, size - tile, tile - overlap))
+        starts.append(size - tile)
+        return starts
+
+    @staticmethod
+    def _tile_edges(faces, tile_shape, y0, x0, height, width, overlap, margin=2):
+        """
+        Find the faces of a tile cut by one of its inner edges. They are dropped if small enough to be entirely
+        contained in a neighbouring tile
+        :param faces: [N 5] faces in tile coordinates
+        :param tile_shape: tile shape
+        :param y0: tile row offset in the image
+        :param x0: tile column offset in the image
+        :param height: image height
+        :param width: image width
+        :param overlap: overlap between neighbouring tiles
+        :param margin: distance to an edge under which a face is considered cut, in pixels
+        :return: tuple boolean [N] masks of the faces kept, and of the faces cut
+        """
+        tile_h, tile_w = tile_shape[0], tile_shape[1]
+        box_w = faces[:, 2] - faces[:, 0]
+        box_h = faces[:, 3] - faces[:, 1]
+        cut_x = np.zeros(faces.shape[0], dtype=bool)
+        cut_y = np.zeros(faces.shape[0], dtype=bool)
+        if x0 > 0:
+            cut_x |= faces[:, 0] <= margin
+        if x0 + tile_w < width:
+            cut_x |= faces[:, 2] >= tile_w - 1 - margin
+        if y0 > 0:
+            cut_y |= faces[:, 1] <= margin
+        if y0 + tile_h < height:
+            cut_y |= faces[:, 3] >= tile_h - 1 - margin
+        drop = (cut_x & (box_w < overlap)) | (cut_y & (box_h < overlap))
+        return ~drop, cut_x | cut_y
+
+    @staticmethod
+    def _merge_cut_faces(faces, landmarks, min_overlap=0.5):
+        """
+        Merge the parts of faces cut by tile edges into their union boxes. Parts whose intersection covers more
+        than min_overlap of the smaller one are merged, keeping the best score and the landmarks of the largest part
+        :param faces: [N 5] faces in image coordinates
+        :param landmarks: [N 5 2] landmarks
+        :param min_overlap: minimum intersection over the smaller area
+        :return: tuple merged faces, landmarks
+        """
+        order = ((faces[:, 2] - faces[:, 0]) * (faces[:, 3] - faces[:, 1])).argsort()[::-1]
+        merged = []
+        for i in order:
+            box = faces[i].copy()
+            landmark = landmarks[i]
+            changed = True
+            while changed:
+                changed = False
+                for j, (other, other_landmark) in enumerate(merged):
+                    w = min(box[2], other[2]) - max(box[0], other[0])
+                    h = min(box[3], other[3]) - max(box[1], other[1])
+                    if w <= 0 or h <= 0:
+                        continue
+                    area = min((box[2] - box[0]) * (box[3] - box[1]), (other[2] - other[0]) * (other[3] - other[1]))
+                    if w * h > min_overlap * area:
+                        box[0:2] = np.minimum(box[0:2], other[0:2])
+                        box[2:4] = np.maximum(box[2:4], other[2:4])
+                        box[4] = max(box[4], other[4])
+                        landmark = other_landmark
+                        del merged[j]
+                        changed = True
+                        break
+            merged.append((box, landmark))
+        return np.array([box for box, _ in merged]), np.array([landmark for _, landmark in merged])
+
+    def shape_bucket(self, im_shape):
+        """
+        Input shape an image is fed to the network with. Images of the same shape bucket can be detected
+        together by detect_batch without extra padding
+        :param im_shape: input image shape
+        :return: hashable shape bucket
+        """
+        im_scale = self._get_scale(im_shape)
+        if self.in_graph_preprocess:
+            return tuple(im_shape), im_scale
+        if self.input_size is not None:
+            return self.input_size
+        return (self._get_bucket(int(np.round(im_shape[0] * im_scale))),
+                self._get_bucket(int(np.round(im_shape[1] * im_scale))))
+
+    def _detect_batch_raw(self, images, im_scales, thresholds):
+        """
+        detect_batch for in graph preprocessing: images sharing shape and scale are stacked and run together
+        :param images: list of input images
+        :param im_scales: list of resizing scales, one per image
+        :param thresholds: list of detection thresholds, one per image
+        :return: list of tuples faces, landmarks, one per image
+        """
+        groups = OrderedDict()
+        for i, (img, im_scale) in enumerate(zip(images, im_scales)):
+            groups.setdefault((img.shape, im_scale), []).append(i)
+
+        results = [None] * len(images)
+        for (im_shape, im_scale), indices in groups.items():
+            im_batch = np.stack([images[i] for i in indices])
+            im_info = self._raw_im_info(im_shape, im_scale)
+            net_out = self._forward((im_batch, np.tile(np.array(im_info, dtype=np.int32), (len(indices), 1))))
+            for n, i in enumerate(indices):
+                results[i] = self._postprocess(net_out, n, im_info, im_scale, thresholds[i])
+        return results
+
+    @staticmethod
+    def _raw_im_info(im_shape, im_scale):
+        """
+        Size an image is resized to by the in graph preprocessing, fed to the network as is
+        :param im_shape: input image shape
+        :param im_scale: resizing scale
+        :return: resized image size
+        """
+        return [int(np.round(im_shape[0] * im_scale)), int(np.round(im_shape[1] * im_scale))]
+
+    def detect_stream(self, items, threshold=0.5, preprocess_workers=2, inference_workers=1, postprocess_workers=2,
+                      queue_size=4):
+        """
+        Detect the faces of a stream of images with a pipeline of thread pools, so that image decoding and
+        preprocessing, inference, and decoding and nms of different images overlap. Stages are connected by
+        bounded queues owned by the returned stream, whose queue_depths method gives their current depths.
+        Several streams can run at the same time on the same detector.
+        The tflite and int8 interpreters are not thread safe, use a single inference worker with them
+        :param items: iterable of image paths or BGR images
+        :param threshold: detection threshold
+        :param preprocess_workers: number of image reading and preprocessing threads
+        :param inference_workers: number of inference threads
+        :param postprocess_workers: number of decoding and nms threads
+        :param queue_size: maximum depth of the queues between stages
+        :return: DetectStream, iterator of tuples faces, landmarks, in the order of the items
+        """
+        if self.reuse_input_buffer:
+            raise ValueError('detect_stream can not share the input buffer between its preprocessing workers')
+        queues = OrderedDict((name, queue.Queue(queue_size)) for name in ('inputs', 'preprocessed', 'inferred'))
+        queues['results'] = queue.Queue()
+        return DetectStream(queues, self._stream_results(items, queues, threshold, preprocess_workers,
+                                                         inference_workers, postprocess_workers, queue_size))
+
+    def _stream_results(self, items, queues, threshold, preprocess_workers, inference_workers, postprocess_workers,
+                        queue_size):
+        """
+        Start the detect_stream threads on its queues, and yield their results in the order of the items
+        """
+        stop = threading.Event()
+        # bounds the results waiting to be yielded in order
+        in_flight = threading.Semaphore(3 * queue_size + preprocess_workers + inference_workers + postprocess_workers)
+        stages = [(self._stream_preprocess, 'inputs', 'preprocessed', preprocess_workers),
+                  (self._stream_inference, 'preprocessed', 'inferred', inference_workers),
+                  (lambda job: self._stream_postprocess(job, threshold), 'inferred', 'results', postprocess_workers)]
+        feeder_state = {'count': None}
+        threads = [threading.Thread(target=self._stream_feed, args=(items, queues, in_flight, stop, feeder_state))]
+        for fn, in_name, out_name, num_workers in stages:
+            remaining = [num_workers]
+            lock = threading.Lock()
+            for _ in range(num_workers):
+                threads.append(threading.Thread(target=self._stream_worker,
+                                                args=(fn, queues, in_name, out_name, remaining, lock, stop)))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        results = queues['results']
+        pending = {}
+        next_index = 0
+        try:
+            while feeder_state['count'] is None or next_index < feeder_state['count']:
+                if next_index in pending:
+                    result = pending.pop(next_index)
+                    next_index += 1
+                    in_flight.release()
+                    if isinstance(result, Exception):
+                        raise result
+                    yield result
+                    continue
+                try:
+                    index, result = results.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if index is None:
+                    if isinstance(result, Exception):
+                        raise result
+                    continue
+                pending[index] = result
+        finally:
+            stop.set()
+
+    @staticmethod
+    def _stream_put(q, item, stop):
+        """
+        Put an item in a bounded queue, giving up when the stream stops
+        :return: whether the item was put
+        """
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _stream_feed(self, items, queues, in_flight, stop, feeder_state):
+        """
+        Feed the items of detect_stream to its first queue, then the end of stream sentinel
+        """
+        count = 0
+        try:
+            for item in items:
+                while not in_flight.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                if not self._stream_put(queues['inputs'], (count, item), stop):
+                    return
+                count += 1
+        except Exception as e:
+            queues['results'].put((None, e))
+            return
+        self._stream_put(queues['inputs'], None, stop)
+        feeder_state['count'] = count
+        queues['results'].put((None, None))
+
+    def _stream_worker(self, fn, queues, in_name, out_name, remaining, lock, stop):
+        """
+        Run a detect_stream stage on the jobs of its input queue. Failures are sent to the results queue.
+        The end of stream sentinel is passed back for the other workers of the stage, and forwarded to the next
+        stage by the last one
+        """
+        in_queue = queues[in_name]
+        out_queue = queues[out_name]
+        while not stop.is_set():
+            try:
+                job = in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if job is None:
+                self._stream_put(in_queue, None, stop)
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last and out_name != 'results':
+                    self._stream_put(out_queue, None, stop)
+                return
+            try:
+                job = fn(job)
+            except Exception as e:
+                queues['results'].put((job[0], e))
+                continue
+            self._stream_put(out_queue, job, stop)
+
+    def _stream_preprocess(self, job):
+        """
+        detect_stream stage reading an image if needed, and preprocessing it into a batch of one
+        """
+        index, item = job
+        img = cv2.imread(item) if isinstance(item, str) else item
+        if img is None:
+            raise IOError('could not read image %s' % item)
+        im_scale = self._get_scale(img.shape)
+        if self.in_graph_preprocess:
+            im_info = self._raw_im_info(img.shape, im_scale)
+            inputs = (img[np.newaxis], np.array([im_info], dtype=np.int32))
+        else:
+            inputs, im_infos = self._preprocess_batch([img], [im_scale])
+            im_info = im_infos[0]
+        return index, inputs, im_info, im_scale
+
+    def _stream_inference(self, job):
+        """
+        detect_stream stage running the network
+        """
+        index, inputs, im_info, im_scale = job
+        return index, self._forward(inputs), im_info, im_scale
+
+    def _stream_postprocess(self, job, threshold):
+        """
+        detect_stream stage decoding the detections and running nms
+        """
+        index, net_out, im_info, im_scale = job
+        return index, self._postprocess(net_out, 0, im_info, im_scale, threshold)
+
+    def end_to_end_model(self, size, threshold=0.5, max_detections=100, pre_nms_topk=5000):
+        """
+        Build a fixed size model that also runs anchor decoding, thresholding and nms in the graph,
+        sharing the weights of this detector. See RetinaFaceEndToEndNetwork for its inputs and outputs
+        :param size: input size, int or (height, width), multiple of 32
+        :param threshold: detection threshold
+        :param max_detections: number of detections returned per image
+        :param pre_nms_topk: number of highest scoring anchors kept before nms
+        :return: tf.keras.models.Model
+        """
+        if self.model is None or self.in_graph_preprocess:
+            raise ValueError('end to end model requires the keras backend without in_graph_preprocess')
+        return RetinaFaceEndToEndNetwork(self.model, self._anchors_fpn, self._feat_stride_fpn, size,
+                                         score_threshold=threshold, nms_threshold=self.nms_threshold,
+                                         max_detections=max_detections, pre_nms_topk=pre_nms_topk).model
+
+    def inference_stats(self):
+        """
+        Statistics of the compiled inference function
+        :return: dict with the number of calls, traces and trace cache hits
+        """
+        return {'calls': self.infer_calls,
+                'traces': self.trace_count,
+                'cache_hits': self.infer_calls - self.trace_count}
+
+    def memory_report(self):
+        """
+        Host memory held by the detector, in bytes. Weights are the model variables with the keras and saved_model
+        backends, and the model file size with the tflite, int8 and onnx backends, whose runtimes load it whole.
+        Runtime arenas and activations are not included
+        :return: dict with weights, anchor_cache, input_buffer and total bytes
+        """
+        if self.model is not None:
+            weights = sum(int(np.prod(v.shape)) * v.dtype.size for v in self.model.variables)
+        else:
+            weights = self.inference_backend.weights_nbytes()
+        with self._anchor_cache_lock:
+            anchor_cache = sum(array.nbytes for anchors, geometry in self._anchor_cache.values()
+                               for array in (anchors,) + geometry)
+        input_buffer = self._input_buffer.nbytes if self._input_buffer is not None else 0
+        return {'weights': weights,
+                'anchor_cache': anchor_cache,
+                'input_buffer': input_buffer,
+                'total': weights + anchor_cache + input_buffer}
+
+    def _infer_fn(self, inputs):
+        # python side effects only run while tracing, once per new input shape
+        self.trace_count += 1
+        return self.model(inputs, training=False)
+
+    def _forward(self, inputs):
+        """
+        Run the network on a NHWC batch
+        :param inputs: NHWC float32 batch, or tuple of NHWC uint8 batch and resized sizes with in graph preprocessing
+        :return: list of NHWC numpy outputs, 3 per stride
+        """
+        self.infer_calls += 1
+        if self.inference_backend is not None:
+            return self.inference_backend(inputs)
+        net_out = self._infer(tf.nest.map_structure(tf.convert_to_tensor, inputs))
+        return [out.numpy() for out in net_out]
+
+    def _get_bucket(self, size):
+        """
+        Smallest bucket that fits an input dimension
+        :param size: input height or width
+        :return: padded size
+        """
+        for bucket in self.bucket_sizes:
+            if bucket >= size:
+                return bucket
+        return int(np.ceil(size / 32.)) * 32
+
+    def _get_scale(self, im_shape, target_size=None, max_size=None, min_face_size=None):
+        """
+        Compute the resizing scale of an image so that its short side matches the target size
+        without its long side exceeding the max size. In min_face_size mode, the scale brings faces of
+        min_face_size pixels to the smallest anchor size instead
+        :param im_shape: input image shape
+        :param target_size: target size, defaults to the detector one
+        :param max_size: max size, defaults to the detector one
+        :param min_face_size: min face size, defaults to the detector one unless a target size is given
+        :return: float im_scale
+        """
+        if min_face_size is None and target_size is None:
+            min_face_size = self.min_face_size
+        target_size = target_size if target_size is not None else self.scales[0]
+        max_size = max_size if max_size is not None else self.scales[1]
         im_size_min = np.min(im_shape[0:2])
         im_size_max = np.max(im_shape[0:2])
-        im_scale = float(target_size) / float(im_size_min)
+        if min_face_size is not None:
+            im_scale = self.min_anchor_size / float(min_face_size)
+        else:
+            im_scale = float(target_size) / float(im_size_min)
         if np.round(im_scale * im_size_max) > max_size:
             im_scale = float(max_size) / float(im_size_max)
-        if im_scale != 1.0:
-            img = cv2.resize(img, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
-        
-        img = img.astype(np.float32)
-        im_info = [img.shape[0], img.shape[1]]
-        im_tensor = np.zeros((1, 3, img.shape[0], img.shape[1]))
-        for i in range(3):
-            im_tensor[0, i, :, :] = (img[:, :, 2 - i] / self.pixel_scale - self.pixel_means[2 - i]) / self.pixel_stds[
-                2 - i]
-        net_out = self.model.predict(im_tensor.transpose(0, 2, 3, 1))
-        net_out_reshaped = []
-        for elt in net_out:
-            net_out_reshaped.append(elt.transpose(0, 3, 1, 2))
-        net_out = net_out_reshaped
+        if self.input_size is not None:
+            im_scale = min(im_scale, float(self.input_size[0]) / im_shape[0], float(self.input_size[1]) / im_shape[1])
+        return im_scale
+
+    def _preprocess(self, img, out=None):
+        """
+        Convert a BGR uint8 image into normalized float32 RGB channels in a single vectorized pass
+        :param img: HWC BGR image
+        :param out: optional HWC float32 array to write into
+        :return: HWC float32 array
+        """
+        if out is None:
+            out = np.empty(img.shape, dtype=np.float32)
+        np.multiply(img[:, :, ::-1], self._pixel_mul, out=out)
+        if self._pixel_add.any():
+            out += self._pixel_add
+        return out
+
+    def _preprocess_batch(self, images, im_scales, out=None):
+        """
+        Resize and normalize images, and stack them into a NHWC batch zero padded to a shape bucket
+        :param images: list of input images
+        :param im_scales: list of resizing scales, one per image
+        :param out: optional NHWC float32 buffer reused when it has the batch shape
+        :return: tuple NHWC float32 batch, list of resized image sizes
+        """
+        resized = []
+        for img, im_scale in zip(images, im_scales):
+            if im_scale != 1.0:
+                img = cv2.resize(img, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+            resized.append(img)
+        im_infos = [[img.shape[0], img.shape[1]] for img in resized]
+        if self.input_size is not None:
+            batch_h, batch_w = self.input_size
+        else:
+            batch_h = self._get_bucket(max(im_info[0] for im_info in im_infos))
+            batch_w = self._get_bucket(max(im_info[1] for im_info in im_infos))
+
+        batch_shape = (len(resized), batch_h, batch_w, 3)
+        if out is None and self.reuse_input_buffer:
+            out = self._input_buffer
+        if out is None or out.shape != batch_shape:
+            out = np.zeros(batch_shape, dtype=np.float32)
+            if self.reuse_input_buffer:
+                self._input_buffer = out
+        for n, img in enumerate(resized):
+            h, w = img.shape[0], img.shape[1]
+            self._preprocess(img, out[n, :h, :w])
+            out[n, h:] = 0
+            out[n, :h, w:] = 0
+        return out, im_infos
+
+    def _get_anchors(self, height, width, stride):
+        """
+        Anchor plane of a feature map and its geometry, served from the LRU anchor cache when possible
+        :param height: feature map height
+        :param width: feature map width
+        :param stride: feature map stride
+        :return: tuple [K*A 4] anchors, anchor_geometry of the anchors
+        """
+        key = (height, width, stride)
+        with self._anchor_cache_lock:
+            entry = self._anchor_cache.get(key)
+            if entry is not None:
+                self._anchor_cache.move_to_end(key)
+                return entry
+
+        A = self._num_anchors['stride%s'%stride]
+        anchors_fpn = self._anchors_fpn['stride%s'%stride]
+        anchors = anchors_plane(height, width, stride, anchors_fpn)
+        anchors = anchors.reshape((height * width * A, 4))
+        entry = (anchors, self.anchor_geometry(anchors))
+        # cached planes are shared between calls, make sure nobody decodes in place
+        for array in (anchors,) + entry[1]:
+            array.flags.writeable = False
+        if self.anchor_cache_size > 0:
+            with self._anchor_cache_lock:
+                self._anchor_cache[key] = entry
+                while len(self._anchor_cache) > self.anchor_cache_size:
+                    self._anchor_cache.popitem(last=False)
+        return entry
+
+    def _select_anchors(self, height, width, stride, ih, iw, ia):
+        """
+        Anchors of a subset of the feature map cells and their geometry. They are gathered from the
+        cached anchor plane when the anchor cache is enabled, and generated on the fly otherwise
+        :param height: padded feature map height, the cells of the padding are never selected
+        :param width: padded feature map width
+        :param stride: feature map stride
+        :param ih: row index of the selected cells
+        :param iw: column index of the selected cells
+        :param ia: anchor index of the selected cells
+        :return: tuple [N 4] anchors, anchor_geometry of the anchors
+        """
+        A = self._num_anchors['stride%s'%stride]
+        if self.anchor_cache_size > 0:
+            anchors, geometry = self._get_anchors(height, width, stride)
+            order = (ih * width + iw) * A + ia
+            return anchors[order], tuple(g[order] for g in geometry)
+
+        anchors_fpn = self._anchors_fpn['stride%s'%stride]
+        shifts = np.stack([iw * stride, ih * stride, iw * stride, ih * stride], axis=1)
+        anchors = (anchors_fpn[ia] + shifts).astype(np.float32)
+        return anchors, self.anchor_geometry(anchors)
+
+    def _postprocess(self, net_out, index, im_info, im_scale, threshold):
+        """
+        Decode the network outputs of one image of the batch into faces and landmarks
+        :param net_out: list of NHWC network outputs, 3 per stride
+        :param index: index of the image in the batch
+        :param im_info: size of the resized image, before padding
+        :param im_scale: resizing scale of the image
+        :param threshold: detection threshold
+        :return: tuple faces, landmarks
+        """
+        proposals_list = []
+        scores_list = []
+        landmarks_list = []
         sym_idx = 0
 
         for _idx,s in enumerate(self._feat_stride_fpn):
             _key = 'stride%s'%s
             stride = int(s)
-            scores = net_out[sym_idx]
-            scores = scores[:, self._num_anchors['stride%s'%s]:, :, :]
+            # feature map cells covering the padding added by the batching are dropped
+            height = int(np.ceil(im_info[0] / stride))
+            width = int(np.ceil(im_info[1] / stride))
+            A = self._num_anchors['stride%s'%s]
 
-            bbox_deltas = net_out[sym_idx + 1]
-            height, width = bbox_deltas.shape[2], bbox_deltas.shape[3]
+            # threshold first, only the anchors that pass it are generated and decoded
+            # face probabilities are the last A channels, with both softmax and sigmoid score heads
+            scores = net_out[sym_idx][index, :height, :width, -A:]
+            if stride==4 and self.decay4<1.0:
+                scores = scores * self.decay4
+            ih, iw, ia = np.where(scores>=threshold)
+            if ih.shape[0]==0:
+                sym_idx += 3
+                continue
+            scores = scores[ih, iw, ia].reshape((-1, 1))
+            # anchors are taken from the plane of the padded feature map, shared by all the images of a bucket
+            plane_height, plane_width = net_out[sym_idx].shape[1:3]
+            anchors, geometry = self._select_anchors(plane_height, plane_width, stride, ih, iw, ia)
 
-            A = self._num_anchors['stride%s'%s]
-            K = height * width
-            anchors_fpn = self._anchors_fpn['stride%s'%s]
-            anchors = anchors_plane(height, width, stride, anchors_fpn)
-            anchors = anchors.reshape((K * A, 4))
-            scores = scores.transpose((0, 2, 3, 1)).reshape((-1, 1))
-
-            bbox_deltas = bbox_deltas.transpose((0, 2, 3, 1))
-            bbox_pred_len = bbox_deltas.shape[3]//A
-            bbox_deltas = bbox_deltas.reshape((-1, bbox_pred_len))
+            bbox_deltas = net_out[sym_idx + 1][index]
+            bbox_pred_len = bbox_deltas.shape[2]//A
+            bbox_deltas = bbox_deltas.reshape((bbox_deltas.shape[0], bbox_deltas.shape[1], A, bbox_pred_len))
+            bbox_deltas = bbox_deltas[ih, iw, ia]
             bbox_deltas[:, 0::4] = bbox_deltas[:,0::4] * self.bbox_stds[0]
             bbox_deltas[:, 1::4] = bbox_deltas[:,1::4] * self.bbox_stds[1]
             bbox_deltas[:, 2::4] = bbox_deltas[:,2::4] * self.bbox_stds[2]
             bbox_deltas[:, 3::4] = bbox_deltas[:,3::4] * self.bbox_stds[3]
-            proposals = self.bbox_pred(anchors, bbox_deltas)
+            proposals = self.bbox_pred(anchors, bbox_deltas, geometry)
 
             proposals = clip_boxes(proposals, im_info[:2])
 
-
-            if stride==4 and self.decay4<1.0:
-                scores *= self.decay4
-
-            scores_ravel = scores.ravel()
-            order = np.where(scores_ravel>=threshold)[0]
-            proposals = proposals[order, :]
-            scores = scores[order]
-
             proposals[:, 0:4] /= im_scale
             proposals_list.append(proposals)
             scores_list.append(scores)
 
-            landmark_deltas = net_out[sym_idx + 2]
-            landmark_pred_len = landmark_deltas.shape[1]//A
-            landmark_deltas = landmark_deltas.transpose((0, 2, 3, 1)).reshape((-1, 5, landmark_pred_len//5))
-            landmarks = self.landmark_pred(anchors, landmark_deltas)
-            landmarks = landmarks[order, :]
+            landmark_deltas = net_out[sym_idx + 2][index]
+            landmark_pred_len = landmark_deltas.shape[2]//A
+            landmark_deltas = landmark_deltas.reshape((landmark_deltas.shape[0], landmark_deltas.shape[1], A, 5, landmark_pred_len//5))
+            landmark_deltas = landmark_deltas[ih, iw, ia]
+            landmarks = self.landmark_pred(anchors, landmark_deltas, geometry)
 
             landmarks[:, :, 0:2] /= im_scale
             landmarks_list.append(landmarks)
             sym_idx += 3
 
+        if len(proposals_list)==0:
+            landmarks = np.zeros( (0,5,2) )
+            return np.zeros( (0,5) ), landmarks
         proposals = np.vstack(proposals_list)
         if proposals.shape[0]==0:
             landmarks = np.zeros( (0,5,2) )
             return np.zeros( (0,5) ), landmarks
         scores = np.vstack(scores_list)
         scores_ravel = scores.ravel()
-        order = scores_ravel.argsort()[::-1]
+        if self.pre_nms_topk and scores_ravel.shape[0] > self.pre_nms_topk:
+            # partial selection of the top k, only those are sorted
+            order = np.argpartition(scores_ravel, -self.pre_nms_topk)[-self.pre_nms_topk:]
+            order = order[scores_ravel[order].argsort()[::-1]]
+        else:
+            order = scores_ravel.argsort()[::-1]
 
         proposals = proposals[order, :]
         scores = scores[order]
@@ -140,31 +946,54 @@ class RetinaFace:
         landmarks = landmarks[order].astype(np.float32, copy=False)
 
         pre_det = np.hstack((proposals[:,0:4], scores)).astype(np.float32, copy=False)
-        keep = self.nms(pre_det)
+        keep = self._nms(pre_det)
         det = np.hstack( (pre_det, proposals[:,4:]) )
         det = det[keep, :]
         landmarks = landmarks[keep]
 
         return det, landmarks
 
+    def _nms(self, dets):
+        """
+        Nms of score sorted detections, capped at max_detections when it is set
+        :param dets: [N 5] float32 boxes and scores
+        :return: indexes to keep
+        """
+        if self.max_detections:
+            return self.nms(dets, self.max_detections)
+        return self.nms(dets)
+
 
     @staticmethod
-    def bbox_pred(boxes, box_deltas):
+    def anchor_geometry(boxes):
+        """
+        Widths, heights and centers of a set of boxes
+        :param boxes: [N 4]
+        :return: tuple of [N] arrays widths, heights, ctr_x, ctr_y
+        """
+        boxes = boxes.astype(np.float64, copy=False)
+        widths = boxes[:, 2] - boxes[:, 0] + 1.0
+        heights = boxes[:, 3] - boxes[:, 1] + 1.0
+        ctr_x = boxes[:, 0] + 0.5 * (widths - 1.0)
+        ctr_y = boxes[:, 1] + 0.5 * (heights - 1.0)
+        return widths, heights, ctr_x, ctr_y
+
+    @staticmethod
+    def bbox_pred(boxes, box_deltas, geometry=None):
         """
         Transform the set of class-agnostic boxes into class-specific boxes
         by applying the predicted offsets (box_deltas)
         :param boxes: !important [N 4]
         :param box_deltas: [N, 4 * num_classes]
+        :param geometry: optional precomputed anchor_geometry of boxes
         :return: [N 4 * num_classes]
         """
         if boxes.shape[0] == 0:
             return np.zeros((0, box_deltas.shape[1]))
 
-        boxes = boxes.astype(np.float, copy=False)
-        widths = boxes[:, 2] - boxes[:, 0] + 1.0
-        heights = boxes[:, 3] - boxes[:, 1] + 1.0
-        ctr_x = boxes[:, 0] + 0.5 * (widths - 1.0)
-        ctr_y = boxes[:, 1] + 0.5 * (heights - 1.0)
+        if geometry is None:
+            geometry = RetinaFace.anchor_geometry(boxes)
+        widths, heights, ctr_x, ctr_y = geometry
 
         dx = box_deltas[:, 0:1]
         dy = box_deltas[:, 1:2]
@@ -193,14 +1022,12 @@ class RetinaFace:
 
 
     @staticmethod
-    def landmark_pred(boxes, landmark_deltas):
+    def landmark_pred(boxes, landmark_deltas, geometry=None):
         if boxes.shape[0] == 0:
           return np.zeros((0, landmark_deltas.shape[1]))
-        boxes = boxes.astype(np.float, copy=False)
-        widths = boxes[:, 2] - boxes[:, 0] + 1.0
-        heights = boxes[:, 3] - boxes[:, 1] + 1.0
-        ctr_x = boxes[:, 0] + 0.5 * (widths - 1.0)
-        ctr_y = boxes[:, 1] + 0.5 * (heights - 1.0)
+        if geometry is None:
+            geometry = RetinaFace.anchor_geometry(boxes)
+        widths, heights, ctr_x, ctr_y = geometry
         pred = landmark_deltas.copy()
         for i in range(5):
             pred[:,i,0] = landmark_deltas[:,i,0]*widths + ctr_x
@@ -0,0 +1,165 @@
+import time
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _AsyncRequest(object):
+    """
+    Image waiting for detection in AsyncRetinaFace
+    """
+    def __init__(self, img, threshold, future):
+        self.img = img
+        self.threshold = threshold
+        self.future = future
+        self.arrival = time.time()
+
+
+class AsyncRetinaFace(object):
+    """
+    asyncio wrapper of a RetinaFace detector. Inference runs on a dedicated single thread executor, so the event
+    loop is never blocked by a forward pass, and the detector is never called concurrently.
+    Concurrent awaits on images of the same shape bucket are coalesced into detect_batch calls of up to
+    max_batch_size images, waiting at most max_wait_ms for a batch to fill.
+    A cancelled await is dropped from its batch if the batch did not start yet. A semaphore bounds the number of
+    images in flight, further awaits wait for a slot before being queued
+    """
+    def __init__(self, detector, max_batch_size=8, max_wait_ms=2.0, max_in_flight=64):
+        """
+        :param detector: RetinaFace detector
+        :param max_batch_size: maximum number of images per forward pass
+        :param max_wait_ms: maximum time an image waits for its batch to fill
+        :param max_in_flight: maximum number of images queued or being detected
+        """
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_in_flight = max_in_flight
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        # shape bucket -> list of requests, in arrival order
+        self.pending = OrderedDict()
+        self._semaphore = None
+        self._wakeup = None
+        self._task = None
+
+    async def detect(self, img, threshold=0.5):
+        """
+        Detect all the faces and landmarks in an image
+        :param img: input image
+        :param threshold: detection threshold
+        :return: tuple faces, landmarks
+        """
+        self._start()
+        async with self._semaphore:
+            future = asyncio.get_running_loop().create_future()
+            key = self.detector.shape_bucket(img.shape)
+            self.pending.setdefault(key, []).append(_AsyncRequest(img, threshold, future))
+            self._wakeup.set()
+            return await future
+
+    async def detect_many(self, images, threshold=0.5):
+        """
+        Detect all the faces and landmarks in several images, batched with each other and with concurrent awaits
+        :param images: list of input images
+        :param threshold: detection threshold
+        :return: list of tuples faces, landmarks, one per image
+        """
+        return list(await asyncio.gather(*[self.detect(img, threshold) for img in images]))
+
+    async def close(self):
+        """
+        Stop batching, cancel the queued detections and shut the executor down
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for group in self.pending.values():
+            for request in group:
+                request.future.cancel()
+        self.pending.clear()
+        # waits for the batch still in the executor without blocking the loop
+        await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _start(self):
+        """
+        Create the loop bound primitives and the batching task on first use
+        """
+        if self._task is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _drop_cancelled(self):
+        """
+        Remove the cancelled requests from the pending groups
+        """
+        for key in list(self.pending):
+            group = [request for request in self.pending[key] if not request.future.done()]
+            if group:
+                self.pending[key] = group
+            else:
+                del self.pending[key]
+
+    async def _next_batch(self):
+        """
+        Wait for the batch of the oldest pending request to be full or to time out
+        :return: list of requests
+        """
+        while True:
+            self._drop_cancelled()
+            if not self.pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            key, group = min(self.pending.items(), key=lambda item: item[1][0].arrival)
+            deadline = group[0].arrival + self.max_wait
+            while len(group) < self.max_batch_size and time.time() < deadline:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), deadline - time.time())
+                except asyncio.TimeoutError:
+                    break
+            self._drop_cancelled()
+            group = self.pending.get(key)
+            if not group:
+                continue
+            batch = group[:self.max_batch_size]
+            del group[:self.max_batch_size]
+            if not group:
+                del self.pending[key]
+            return batch
+
+    async def _run(self):
+        """
+        Batching task
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            try:
+                results = await loop.run_in_executor(self.executor, self.detector.detect_batch,
+                                                      [request.img for request in batch],
+                                                      [request.threshold for request in batch])
+            except asyncio.CancelledError:
+                for request in batch:
+                    request.future.cancel()
+                raise
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            for request, result in zip(batch, results):
+                # awaits cancelled while their batch ran are not answered
+                if not request.future.done():
+                    request.future.set_result(result)
@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import socket
+import threading
+import http.client
+import numpy as np
+from absl import flags
+from absl.flags import FLAGS
+from script_utils import run_script
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over a unix socket
+    """
+    def __init__(self, path):
+        http.client.HTTPConnection.__init__(self, 'localhost')
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def _connect():
+    if FLAGS.unix_socket:
+        return UnixHTTPConnection(FLAGS.unix_socket)
+    return http.client.HTTPConnection(FLAGS.host, FLAGS.port)
+
+
+def _client(bodies, counter, lock, latencies, errors):
+    """
+    Send requests over a keep alive connection until the request budget is spent
+    """
+    connection = _connect()
+    while True:
+        with lock:
+            index = counter[0]
+            counter[0] += 1
+        if index >= FLAGS.num_requests:
+            break
+        start = time.time()
+        connection.request('POST', '/detect?threshold=%f' % FLAGS.threshold, body=bodies[index % len(bodies)])
+        response = connection.getresponse()
+        response.read()
+        with lock:
+            if response.status == 200:
+                latencies.append(time.time() - start)
+            else:
+                errors.append(response.status)
+    connection.close()
+
+
+def _define_flags():
+    flags.DEFINE_string('host', '127.0.0.1', 'server HTTP host')
+    flags.DEFINE_integer('port', 8080, 'server HTTP port')
+    flags.DEFINE_string('unix_socket', '', 'server unix socket path, replaces host and port')
+    flags.DEFINE_string('images_dir', './sample-images/', 'directory of the images sent, in turn')
+    flags.DEFINE_integer('concurrency', 8, 'number of concurrent clients')
+    flags.DEFINE_integer('num_requests', 200, 'total number of requests')
+    flags.DEFINE_float('threshold', 0.9, 'detection threshold')
+
+
+def _main(_argv):
+    bodies = []
+    for file in sorted(os.listdir(FLAGS.images_dir)):
+        with open(os.path.join(FLAGS.images_dir, file), 'rb') as f:
+            bodies.append(f.read())
+    counter = [0]
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+    threads = [threading.Thread(target=_client, args=(bodies, counter, lock, latencies, errors))
+               for _ in range(FLAGS.concurrency)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+
+    latencies = np.array(latencies) * 1000
+    print('%d requests, %d errors, %.1f images/s' % (len(latencies), len(errors), len(latencies) / elapsed))
+    if len(latencies):
+        print('client latency ms: p50 %.1f p95 %.1f p99 %.1f' % tuple(np.percentile(latencies, [50, 95, 99])))
+    connection = _connect()
+    connection.request('GET', '/stats')
+    print('server stats:', json.loads(connection.getresponse().read().decode('utf-8')))
+
+
+if __name__ == '__main__':
+    run_script(_define_flags, _main)
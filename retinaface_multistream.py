@@ -0,0 +1,334 @@
+import json
+import time
+import threading
+from collections import deque
+import numpy as np
+import cv2
+from absl import flags, logging
+from absl.flags import FLAGS
+from retinaface import RetinaFace
+from script_utils import run_script
+
+
+class _Stream(object):
+    """
+    Stream registered in the MultiStreamScheduler, holding its latest frame only
+    """
+    def __init__(self, callback, error_callback, threshold, deadline, stats_window):
+        self.callback = callback
+        self.error_callback = error_callback
+        self.threshold = threshold
+        self.deadline = deadline
+        self.frame = None
+        self.arrival = None
+        # arrival of the first frame not detected yet, kept when that frame is replaced so that a stream whose
+        # frames keep being dropped still reaches its deadline
+        self.waiting_since = None
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.late = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=stats_window)
+
+
+class MultiStreamScheduler(object):
+    """
+    Detects the faces of many video streams with one detector, batching frames across streams.
+    Only the latest frame of each stream is kept: a frame replaced before being detected is dropped and counted.
+    Every tick selects up to max_batch_size streams with a fresh frame, round robin or earliest deadline first,
+    resizes their frames to fit the same input_size so they share a shape bucket, runs a single forward pass,
+    and hands the detections to the callback of each stream.
+    A tick runs as soon as max_batch_size frames are ready, or once the oldest frame waited max_wait_ms.
+    Callbacks are called from the scheduling thread and should return quickly
+    """
+    def __init__(self, detector, input_size=(640, 640), max_batch_size=8, max_wait_ms=5.0, policy='round_robin',
+                 stats_window=1000):
+        """
+        :param detector: RetinaFace detector, only called from the scheduling thread
+        :param input_size: (height, width) every frame is resized to fit in, replaced by the detector fixed input
+            size if it has one. Build the detector with input_size for every batch to be padded to that exact shape,
+            otherwise batches are padded to the bucket of their largest frame
+        :param max_batch_size: maximum number of frames per forward pass
+        :param max_wait_ms: maximum time a frame waits for its batch to fill
+        :param policy: 'round_robin' to serve the streams in turn, or 'deadline' to serve the frames closest to
+            their deadline first
+        :param stats_window: number of most recent frames of each stream the latency percentiles are computed on
+        """
+        if policy not in ('round_robin', 'deadline'):
+            raise ValueError('unknown policy %s' % policy)
+        self.detector = detector
+        self.input_size = tuple(detector.input_size or input_size)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.policy = policy
+        self.stats_window = stats_window
+        self.condition = threading.Condition()
+        # stream id -> _Stream, in registration order
+        self.streams = {}
+        self.cursor = 0
+        self.running = True
+        self.num_ticks = 0
+        self.batched_frames = 0
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def add_stream(self, stream_id, callback, threshold=0.5, deadline_ms=200.0, error_callback=None):
+        """
+        Register a stream
+        :param stream_id: hashable stream id
+        :param callback: called with stream_id, frame, faces, landmarks for every detected frame
+        :param threshold: detection threshold
+        :param deadline_ms: latency budget of the frames, frames detected later are counted as late
+        :param error_callback: called with stream_id, frame, exception when the detection of a frame or its
+            callback fails. Failures are logged and counted in any case
+        """
+        with self.condition:
+            if stream_id in self.streams:
+                raise ValueError('stream %s already registered' % stream_id)
+            self.streams[stream_id] = _Stream(callback, error_callback, threshold, deadline_ms / 1000.0,
+                                              self.stats_window)
+
+    def remove_stream(self, stream_id):
+        """
+        Unregister a stream, its pending frame is dropped
+        :param stream_id: stream id
+        """
+        with self.condition:
+            del self.streams[stream_id]
+
+    def submit(self, stream_id, frame, timestamp=None):
+        """
+        Make a frame the latest frame of its stream, replacing the previous one if it was not detected yet
+        :param stream_id: stream id
+        :param frame: BGR frame
+        :param timestamp: capture time.time() of the frame the latency is measured from, defaults to now
+        """
+        with self.condition:
+            stream = self.streams[stream_id]
+            arrival = timestamp if timestamp is not None else time.time()
+            if stream.frame is not None:
+                stream.dropped += 1
+            else:
+                stream.waiting_since = arrival
+            stream.frame = frame
+            stream.arrival = arrival
+            stream.submitted += 1
+            self.condition.notify()
+
+    def close(self):
+        """
+        Stop the scheduling thread once the pending frames are detected
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def stats(self):
+        """
+        Scheduling statistics, latencies over the stats window
+        :return: dict with the tick count, mean batch fill ratio, and for every stream the submitted, processed,
+            dropped and late frame counts, detection and callback errors and p50/p95/p99 end to end latency in ms
+        """
+        with self.condition:
+            stats = {'ticks': self.num_ticks,
+                     'batch_fill_ratio': float(self.batched_frames) / max(self.num_ticks * self.max_batch_size, 1),
+                     'streams': {}}
+            for stream_id, stream in self.streams.items():
+                latencies = np.array(stream.latencies) * 1000
+                stream_stats = {'submitted': stream.submitted,
+                                'processed': stream.processed,
+                                'dropped': stream.dropped,
+                                'late': stream.late,
+                                'errors': stream.errors}
+                for p in (50, 95, 99):
+                    stream_stats['p%d_ms' % p] = float(np.percentile(latencies, p)) if len(latencies) else 0.0
+                stats['streams'][str(stream_id)] = stream_stats
+        return stats
+
+    def _ready(self):
+        """
+        :return: list of the ids of the streams with a frame waiting, in registration order
+        """
+        return [stream_id for stream_id, stream in self.streams.items() if stream.frame is not None]
+
+    def _select(self, ready):
+        """
+        Pick the streams of the next batch
+        :param ready: ids of the streams with a frame waiting
+        :return: list of at most max_batch_size stream ids
+        """
+        if len(ready) <= self.max_batch_size:
+            selected = ready
+        elif self.policy == 'deadline':
+            selected = sorted(ready, key=lambda stream_id: self.streams[stream_id].waiting_since +
+                              self.streams[stream_id].deadline)[:self.max_batch_size]
+        else:
+            ids = list(self.streams)
+            start = self.cursor % len(ids)
+            order = {stream_id: (n - start) % len(ids) for n, stream_id in enumerate(ids)}
+            selected = sorted(ready, key=order.get)[:self.max_batch_size]
+            self.cursor = ids.index(selected[-1]) + 1
+        return selected
+
+    def _next_batch(self):
+        """
+        Wait for max_batch_size frames to be ready or for the oldest one to time out, and take them
+        :return: list of tuples stream id, stream, frame, arrival, empty when stopped
+        """
+        with self.condition:
+            while True:
+                ready = self._ready()
+                if ready:
+                    break
+                if not self.running:
+                    return []
+                self.condition.wait()
+            deadline = min(self.streams[stream_id].waiting_since for stream_id in ready) + self.max_wait
+            while self.running and len(ready) < self.max_batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                self.condition.wait(timeout)
+                ready = self._ready()
+            batch = []
+            for stream_id in self._select(ready):
+                stream = self.streams[stream_id]
+                batch.append((stream_id, stream, stream.frame, stream.arrival))
+                stream.frame = None
+            return batch
+
+    def _run(self):
+        """
+        Scheduling thread
+        """
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            frames = [frame for _, _, frame, _ in batch]
+            try:
+                # every frame fits in input_size, so the whole batch shares one shape bucket
+                im_scales = [min(float(self.input_size[0]) / frame.shape[0],
+                                 float(self.input_size[1]) / frame.shape[1]) for frame in frames]
+                results = self.detector.detect_batch_scaled(frames, im_scales,
+                                                            [stream.threshold for _, stream, _, _ in batch])
+            except Exception as e:
+                logging.exception('detection of a batch of %d frames failed', len(batch))
+                with self.condition:
+                    self.num_ticks += 1
+                    self.batched_frames += len(batch)
+                for stream_id, stream, frame, _ in batch:
+                    self._fail(stream_id, stream, frame, e)
+                continue
+            end = time.time()
+            with self.condition:
+                self.num_ticks += 1
+                self.batched_frames += len(batch)
+                for _, stream, _, arrival in batch:
+                    stream.processed += 1
+                    stream.latencies.append(end - arrival)
+                    if end - arrival > stream.deadline:
+                        stream.late += 1
+            for (stream_id, stream, frame, _), (faces, landmarks) in zip(batch, results):
+                try:
+                    stream.callback(stream_id, frame, faces, landmarks)
+                except Exception as e:
+                    logging.exception('callback of stream %s failed', stream_id)
+                    self._fail(stream_id, stream, frame, e)
+
+    def _fail(self, stream_id, stream, frame, error):
+        """
+        Count a failure of a stream and hand it to its error callback
+        :param stream_id: stream id
+        :param stream: _Stream
+        :param frame: frame whose detection or callback failed
+        :param error: exception
+        """
+        with self.condition:
+            stream.errors += 1
+        if stream.error_callback is not None:
+            try:
+                stream.error_callback(stream_id, frame, error)
+            except Exception:
+                logging.exception('error callback of stream %s failed', stream_id)
+
+
+def read_stream(scheduler, stream_id, url, stop):
+    """
+    Read the frames of a video stream into the scheduler until it ends or stop is set
+    :param scheduler: MultiStreamScheduler
+    :param stream_id: stream id, registered in the scheduler
+    :param url: cv2.VideoCapture source, rtsp url or video file path
+    :param stop: threading.Event
+    """
+    capture = cv2.VideoCapture(url)
+    while not stop.is_set():
+        ok, frame = capture.read()
+        if not ok:
+            break
+        scheduler.submit(stream_id, frame)
+    capture.release()
+
+
+def _define_flags():
+    flags.DEFINE_string('weights_path', './data/retinafaceweights.npy',
+                        'network weights path, or exported model path with a non keras backend')
+    flags.DEFINE_enum('backend', 'keras', ['keras', 'saved_model', 'tflite', 'int8', 'onnx'], 'inference backend')
+    flags.DEFINE_integer('num_threads', 1, 'number of CPU threads of the tflite interpreter or onnxruntime')
+    flags.DEFINE_bool('use_gpu_nms', True, "whether to use gpu for nms")
+    flags.DEFINE_float('nms_thresh', 0.4, "nms threshold")
+    flags.DEFINE_list('streams', [], 'video stream urls or files, rtsp://... or paths')
+    flags.DEFINE_float('threshold', 0.9, 'detection threshold')
+    flags.DEFINE_list('input_size', [640, 640], 'height,width every frame is resized to fit in')
+    flags.DEFINE_integer('max_batch_size', 8, 'maximum number of frames per forward pass')
+    flags.DEFINE_float('max_wait_ms', 5.0, 'maximum time a frame waits for its batch to fill')
+    flags.DEFINE_enum('policy', 'round_robin', ['round_robin', 'deadline'], 'selection of the streams of a batch')
+    flags.DEFINE_float('deadline_ms', 200.0, 'latency budget of every stream, with the deadline policy')
+    flags.DEFINE_integer('duration', 60, 'seconds to run for, 0 to run until interrupted')
+
+
+def _main(_argv):
+    input_size = [int(size) for size in FLAGS.input_size]
+    detector = RetinaFace(FLAGS.weights_path, FLAGS.use_gpu_nms, FLAGS.nms_thresh, backend=FLAGS.backend,
+                          num_threads=FLAGS.num_threads, input_size=input_size)
+    scheduler = MultiStreamScheduler(detector, input_size, FLAGS.max_batch_size, FLAGS.max_wait_ms, FLAGS.policy)
+    faces_count = {}
+
+    def on_faces(stream_id, frame, faces, landmarks):
+        faces_count[stream_id] = faces.shape[0]
+
+    stop = threading.Event()
+    readers = []
+    for n, url in enumerate(FLAGS.streams):
+        scheduler.add_stream(n, on_faces, FLAGS.threshold, FLAGS.deadline_ms)
+        reader = threading.Thread(target=read_stream, args=(scheduler, n, url, stop))
+        reader.daemon = True
+        reader.start()
+        readers.append(reader)
+    start = time.time()
+    try:
+        while any(reader.is_alive() for reader in readers):
+            if FLAGS.duration and time.time() - start > FLAGS.duration:
+                break
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+        scheduler.close()
+        print(json.dumps(scheduler.stats(), indent=2))
+
+
+if __name__ == '__main__':
+    run_script(_define_flags, _main)
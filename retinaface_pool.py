@@ -0,0 +1,145 @@
+import os
+import queue
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# detector of the current worker process, built once by _init_worker
+_worker_detector = None
+# shared memory input slots attached by the current worker process, slot index -> SharedMemory
+_worker_slots = {}
+
+
+def _init_worker(model_weights, intra_op_threads, inter_op_threads, detector_kwargs):
+    """
+    Build the detector of a worker process, with its thread pools sized before any op runs
+    :param model_weights: weights or exported model path, see RetinaFace
+    :param intra_op_threads: threads used within an op
+    :param inter_op_threads: threads used to run independent ops concurrently
+    :param detector_kwargs: RetinaFace keyword arguments
+    """
+    global _worker_detector
+    os.environ['OMP_NUM_THREADS'] = str(intra_op_threads)
+    import cv2
+    cv2.setNumThreads(intra_op_threads)
+    from retinaface import RetinaFace, tf
+    if tf is not None:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    detector_kwargs = dict(detector_kwargs)
+    detector_kwargs.setdefault('num_threads', intra_op_threads)
+    _worker_detector = RetinaFace(model_weights, **detector_kwargs)
+
+
+def _worker_detect(slot, name, shape, dtype, threshold):
+    """
+    Detect the faces of an image written by the parent process in a shared memory slot
+    :param slot: slot index
+    :param name: shared memory block name of the slot, changes when the parent grows the slot
+    :param shape: image shape
+    :param dtype: image dtype
+    :param threshold: detection threshold
+    :return: tuple faces, landmarks
+    """
+    shm = _worker_slots.get(slot)
+    if shm is None or shm.name != name:
+        if shm is not None:
+            shm.close()
+        shm = shared_memory.SharedMemory(name=name)
+        _worker_slots[slot] = shm
+    # the slot is not reused before this call returns, the image is read in place
+    img = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return _worker_detector.detect(img, threshold)
+
+
+class RetinaFacePool(object):
+    """
+    Pool of worker processes, each running its own RetinaFace detector, so that inference and the numpy/cython
+    post-processing of different images run in parallel without contending on the GIL.
+    TensorFlow does not survive a fork once its runtime is initialized, so workers are spawned and load the model
+    themselves. Pointing them at a memory mapped weights file (convert_weights.py) or an exported model makes
+    loading faster, the file being read once into the page cache for all of them. Each worker still copies the
+    weights into its own TF variables, so resident memory grows with num_workers. Only a backend mapping the model
+    file directly, such as tflite, can share weight pages, and XNNPACK still repacks the weights of the ops it runs.
+    Images are passed to the workers through a fixed set of shared memory slots rather than pickled through the
+    executor pipes, only the detections are pickled back. submit blocks while all the slots are in use.
+    Size num_workers * intra_op_threads to the number of cores to avoid oversubscription
+    """
+    def __init__(self, model_weights, num_workers=None, intra_op_threads=1, inter_op_threads=1,
+                 start_method='spawn', num_slots=None, **detector_kwargs):
+        """
+        :param model_weights: weights or exported model path, see RetinaFace
+        :param num_workers: number of worker processes, defaults to the number of cores / intra_op_threads
+        :param intra_op_threads: threads used within an op by each worker, also the tflite and onnxruntime threads
+        :param inter_op_threads: threads used to run independent ops concurrently by each worker
+        :param start_method: multiprocessing start method of the workers
+        :param num_slots: number of shared memory image slots, i.e. of images in flight, defaults to 2 * num_workers.
+            A slot is allocated on first use and grown to the largest image it receives
+        :param detector_kwargs: RetinaFace keyword arguments, use_gpu_nms defaults to False
+        """
+        if num_workers is None:
+            num_workers = max(1, (os.cpu_count() or 1) // intra_op_threads)
+        detector_kwargs.setdefault('use_gpu_nms', False)
+        self.num_workers = num_workers
+        self._slots = [None] * (num_slots or 2 * num_workers)
+        self._free_slots = queue.Queue()
+        for slot in range(len(self._slots)):
+            self._free_slots.put(slot)
+        self.executor = ProcessPoolExecutor(max_workers=num_workers,
+                                            mp_context=multiprocessing.get_context(start_method),
+                                            initializer=_init_worker,
+                                            initargs=(model_weights, intra_op_threads, inter_op_threads,
+                                                      detector_kwargs))
+
+    def submit(self, img, threshold=0.5):
+        """
+        Detect the faces of an image in a worker
+        :param img: input image
+        :param threshold: detection threshold
+        :return: concurrent.futures.Future of the tuple faces, landmarks
+        """
+        img = np.asarray(img)
+        slot = self._free_slots.get()
+        try:
+            shm = self._slots[slot]
+            if shm is None or shm.size < img.nbytes:
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+                shm = shared_memory.SharedMemory(create=True, size=max(img.nbytes, 1))
+                self._slots[slot] = shm
+            np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)[...] = img
+            future = self.executor.submit(_worker_detect, slot, shm.name, img.shape, img.dtype.str, threshold)
+        except BaseException:
+            self._free_slots.put(slot)
+            raise
+        future.add_done_callback(lambda _: self._free_slots.put(slot))
+        return future
+
+    def map(self, images, threshold=0.5):
+        """
+        Detect the faces of several images across the workers
+        :param images: iterable of input images
+        :param threshold: detection threshold
+        :return: list of tuples faces, landmarks, in the order of the images
+        """
+        futures = [self.submit(img, threshold) for img in images]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """
+        Wait for the pending detections, stop the workers and free the shared memory slots
+        """
+        self.executor.shutdown(wait=True)
+        for slot, shm in enumerate(self._slots):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+                self._slots[slot] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
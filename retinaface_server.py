@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import socket
+import threading
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import cv2
+from absl import flags
+from absl.flags import FLAGS
+from retinaface import RetinaFace
+from script_utils import run_script
+
+
+class _Request(object):
+    """
+    Image waiting for detection in the MicroBatcher
+    """
+    def __init__(self, img, threshold):
+        self.img = img
+        self.threshold = threshold
+        self.arrival = time.time()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher(object):
+    """
+    Collects concurrent detection requests into micro-batches of images of the same shape bucket, and runs each
+    batch with a single detect_batch forward pass. A batch is run as soon as it holds max_batch_size images, or
+    once its oldest request has waited max_wait_ms. Batches are served oldest request first
+    """
+    def __init__(self, detector, max_batch_size=8, max_wait_ms=5.0, stats_window=10000):
+        """
+        :param detector: RetinaFace detector, only called from the batching thread
+        :param max_batch_size: maximum number of images per forward pass
+        :param max_wait_ms: maximum time a request waits for its batch to fill
+        :param stats_window: number of most recent requests the latency percentiles are computed on
+        """
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.condition = threading.Condition()
+        # shape bucket -> list of requests, in arrival order
+        self.pending = OrderedDict()
+        self.running = True
+        self.queue_times = deque(maxlen=stats_window)
+        self.latencies = deque(maxlen=stats_window)
+        self.num_requests = 0
+        self.num_batches = 0
+        self.batched_images = 0
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def detect(self, img, threshold=0.5):
+        """
+        Detect the faces of an image, blocking until its batch ran. Safe to call from many threads
+        :param img: input image
+        :param threshold: detection threshold
+        :return: tuple faces, landmarks
+        """
+        request = _Request(img, threshold)
+        key = self.detector.shape_bucket(img.shape)
+        with self.condition:
+            self.pending.setdefault(key, []).append(request)
+            self.condition.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def close(self):
+        """
+        Stop the batching thread once the pending requests are served
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+
+    def stats(self):
+        """
+        Serving statistics, latencies over the stats window
+        :return: dict with request and batch counts, mean queue time, mean batch fill ratio and
+            p50/p95/p99 latency, times in ms
+        """
+        with self.condition:
+            queue_times = np.array(self.queue_times) * 1000
+            latencies = np.array(self.latencies) * 1000
+            stats = {'requests': self.num_requests,
+                     'batches': self.num_batches,
+                     'batch_fill_ratio': float(self.batched_images) / max(self.num_batches * self.max_batch_size, 1),
+                     'queue_ms': float(queue_times.mean()) if len(queue_times) else 0.0}
+        for p in (50, 95, 99):
+            stats['p%d_ms' % p] = float(np.percentile(latencies, p)) if len(latencies) else 0.0
+        return stats
+
+    def _next_batch(self):
+        """
+        Wait for the batch of the oldest pending request to be full or to time out
+        :return: list of requests, empty when stopped
+        """
+        with self.condition:
+            while not self.pending:
+                if not self.running:
+                    return []
+                self.condition.wait()
+            key, group = min(self.pending.items(), key=lambda item: item[1][0].arrival)
+            deadline = group[0].arrival + self.max_wait
+            while self.running and len(group) < self.max_batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                self.condition.wait(timeout)
+            batch = group[:self.max_batch_size]
+            del group[:self.max_batch_size]
+            if not group:
+                del self.pending[key]
+            return batch
+
+    def _run(self):
+        """
+        Batching thread
+        """
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            start = time.time()
+            try:
+                results = self.detector.detect_batch([request.img for request in batch],
+                                                     [request.threshold for request in batch])
+            except Exception as e:
+                results = None
+                for request in batch:
+                    request.error = e
+            end = time.time()
+            with self.condition:
+                self.num_requests += len(batch)
+                self.num_batches += 1
+                self.batched_images += len(batch)
+                for request in batch:
+                    self.queue_times.append(start - request.arrival)
+                    self.latencies.append(end - request.arrival)
+            for n, request in enumerate(batch):
+                if results is not None:
+                    request.result = results[n]
+                request.done.set()
+
+
+class DetectionHandler(BaseHTTPRequestHandler):
+    """
+    POST /detect?threshold=0.5 with an encoded image (jpeg, png...) as body returns the detections as json:
+    {"faces": [[x1, y1, x2, y2, score], ...], "landmarks": [[[x, y] * 5], ...]}
+    GET /stats returns the MicroBatcher statistics
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            # the body can not be skipped, the connection can not be reused
+            self.close_connection = True
+            return self._reply(400, {'error': 'invalid Content-Length'})
+        # always read the body, an unread one would be parsed as the next request of a keep-alive connection
+        body = self.rfile.read(length)
+        if url.path != '/detect':
+            return self._reply(404, {'error': 'not found'})
+        if not body:
+            return self._reply(400, {'error': 'empty body'})
+        try:
+            img = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+        except cv2.error:
+            img = None
+        if img is None:
+            return self._reply(400, {'error': 'could not decode image'})
+        try:
+            threshold = float(parse_qs(url.query).get('threshold', [0.5])[0])
+        except ValueError:
+            return self._reply(400, {'error': 'threshold must be a number'})
+        try:
+            faces, landmarks = self.server.batcher.detect(img, threshold)
+        except Exception as e:
+            return self._reply(500, {'error': str(e)})
+        self._reply(200, {'faces': faces.tolist(), 'landmarks': landmarks.tolist()})
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/stats':
+            return self._reply(404, {'error': 'not found'})
+        self._reply(200, self.server.batcher.stats())
+
+    def _reply(self, code, content):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    """
+    HTTP server listening on a unix socket
+    """
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        self.socket.bind(self.server_address)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+    def get_request(self):
+        request, _ = self.socket.accept()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ('localhost', 0)
+
+
+def make_server(batcher, host='127.0.0.1', port=8080, unix_socket=None):
+    """
+    Threaded HTTP server answering detection requests through a MicroBatcher
+    :param batcher: MicroBatcher
+    :param host: HTTP host
+    :param port: HTTP port
+    :param unix_socket: unix socket path, replaces host and port
+    :return: http.server.ThreadingHTTPServer, to run with serve_forever
+    """
+    if unix_socket:
+        server = UnixHTTPServer(unix_socket, DetectionHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), DetectionHandler)
+    server.daemon_threads = True
+    server.batcher = batcher
+    return server
+
+
+def _define_flags():
+    flags.DEFINE_string('weights_path', './data/retinafaceweights.npy',
+                        'network weights path, or exported model path with a non keras backend')
+    flags.DEFINE_enum('backend', 'keras', ['keras', 'saved_model', 'tflite', 'int8', 'onnx'], 'inference backend')
+    flags.DEFINE_integer('num_threads', 1, 'number of CPU threads of the tflite interpreter or onnxruntime')
+    flags.DEFINE_bool('use_gpu_nms', True, "whether to use gpu for nms")
+    flags.DEFINE_float('nms_thresh', 0.4, "nms threshold")
+    flags.DEFINE_list('bucket_sizes', [], 'input heights/widths the batches are padded to')
+    flags.DEFINE_string('host', '127.0.0.1', 'HTTP host')
+    flags.DEFINE_integer('port', 8080, 'HTTP port')
+    flags.DEFINE_string('unix_socket', '', 'serve on this unix socket path instead of HTTP over TCP')
+    flags.DEFINE_integer('max_batch_size', 8, 'maximum number of images per forward pass')
+    flags.DEFINE_float('max_wait_ms', 5.0, 'maximum time a request waits for its batch to fill')
+
+
+def _main(_argv):
+    detector = RetinaFace(FLAGS.weights_path, FLAGS.use_gpu_nms, FLAGS.nms_thresh, backend=FLAGS.backend,
+                          num_threads=FLAGS.num_threads, bucket_sizes=[int(size) for size in FLAGS.bucket_sizes])
+    batcher = MicroBatcher(detector, FLAGS.max_batch_size, FLAGS.max_wait_ms)
+    server = make_server(batcher, FLAGS.host, FLAGS.port, FLAGS.unix_socket)
+    print('serving on', FLAGS.unix_socket or '%s:%d' % (FLAGS.host, FLAGS.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        print(json.dumps(batcher.stats()))
+
+
+if __name__ == '__main__':
+    run_script(_define_flags, _main)
@@ -0,0 +1,144 @@
+import numpy as np
+import cv2
+
+
+class VideoRetinaFace(object):
+    """
+    Face detection on video streams, running the full frame detector as rarely as possible.
+    Frames that barely differ from the last processed frame are skipped and get its detections.
+    Between full frame detections, faces are re-detected on crops around their previous boxes only, in a single
+    small batched forward pass. A full frame detection runs every full_every frames, or as soon as a face is lost.
+    New faces are found by the full frame detections
+    """
+    def __init__(self, detector, threshold=0.5, motion_threshold=2.0, motion_size=64, full_every=30,
+                 roi_expand=0.5, roi_face_size=64, match_iou=0.3):
+        """
+        :param detector: RetinaFace detector
+        :param threshold: detection threshold
+        :param motion_threshold: mean absolute difference of the downsampled grayscale frames, in 0-255 gray levels,
+            under which a frame is skipped. 0 disables motion gating
+        :param motion_size: long side of the downsampled frames compared for motion gating
+        :param full_every: run a full frame detection at least every full_every frames
+        :param roi_expand: margin added around each previous box on every side for re-detection, relative to its size
+        :param roi_face_size: size the previous faces are resized to in the re-detection crops
+        :param match_iou: minimum IoU between a previous face and a re-detected face for the face to be found again
+        """
+        self.detector = detector
+        self.threshold = threshold
+        self.motion_threshold = motion_threshold
+        self.motion_size = motion_size
+        self.full_every = full_every
+        self.roi_expand = roi_expand
+        self.roi_face_size = roi_face_size
+        self.match_iou = match_iou
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the previous frames, the next frame gets a full frame detection
+        """
+        self.last_small = None
+        self.faces = np.zeros((0, 5))
+        self.landmarks = np.zeros((0, 5, 2))
+        self.frames_since_full = None
+        self.stats = {'frames': 0, 'skipped': 0, 'roi': 0, 'full': 0}
+
+    def detect(self, frame):
+        """
+        Detect the faces of the next frame of the stream
+        :param frame: BGR frame
+        :return: tuple faces, landmarks, mode, mode being 'skipped', 'roi' or 'full'. 'roi' frames only re-detect the
+            tracked faces, and run no forward pass when no face is tracked
+        """
+        self.stats['frames'] += 1
+        small = self._downsample(frame)
+        due = self.frames_since_full is None or self.frames_since_full + 1 >= self.full_every
+        if not due and self.last_small is not None and self.motion_threshold > 0:
+            motion = np.mean(cv2.absdiff(small, self.last_small))
+            if motion < self.motion_threshold:
+                self.frames_since_full += 1
+                self.stats['skipped'] += 1
+                return self.faces, self.landmarks, 'skipped'
+        self.last_small = small
+
+        if not due and self.faces.shape[0] == 0:
+            # nothing tracked, new faces are only looked for by the full frame detections
+            self.frames_since_full += 1
+            self.stats['roi'] += 1
+            return self.faces, self.landmarks, 'roi'
+
+        if not due:
+            faces, landmarks, lost = self._redetect(frame)
+            if not lost:
+                self.frames_since_full += 1
+                self.stats['roi'] += 1
+                self.faces, self.landmarks = faces, landmarks
+                return faces, landmarks, 'roi'
+
+        self.faces, self.landmarks = self.detector.detect(frame, self.threshold)
+        self.frames_since_full = 0
+        self.stats['full'] += 1
+        return self.faces, self.landmarks, 'full'
+
+    def detect_stream(self, frames):
+        """
+        Detect the faces of a stream of frames
+        :param frames: iterable of BGR frames, see read_frames for a cv2.VideoCapture
+        :return: generator of tuples frame, faces, landmarks, mode
+        """
+        for frame in frames:
+            faces, landmarks, mode = self.detect(frame)
+            yield frame, faces, landmarks, mode
+
+    @staticmethod
+    def read_frames(capture):
+        """
+        Frames of a cv2.VideoCapture
+        :param capture: cv2.VideoCapture
+        :return: generator of BGR frames
+        """
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                return
+            yield frame
+
+    def _downsample(self, frame):
+        """
+        :param frame: BGR frame
+        :return: downsampled grayscale frame compared for motion gating
+        """
+        scale = float(self.motion_size) / max(frame.shape[0], frame.shape[1])
+        small = cv2.resize(frame, None, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _redetect(self, frame):
+        """
+        Re-detect the previous faces on crops around their boxes, in a single forward pass
+        :param frame: BGR frame
+        :return: tuple faces, landmarks, whether a previous face was not found again
+        """
+        faces, landmarks = self.detector.detect_rois(frame, self.faces, self.threshold, self.roi_expand,
+                                                     self.roi_face_size * (1 + 2 * self.roi_expand))
+        if faces.shape[0] == 0:
+            return faces, landmarks, True
+        # a previous face is found again when a re-detected face overlaps it, counts alone would miss a face
+        # leaving one crop while a new one enters another
+        iou = self._iou(self.faces, faces)
+        return faces, landmarks, bool((iou.max(axis=1) < self.match_iou).any())
+
+    @staticmethod
+    def _iou(boxes, other):
+        """
+        :param boxes: [N 4+] boxes
+        :param other: [M 4+] boxes
+        :return: [N M] intersection over union of every pair of boxes
+        """
+        w = np.minimum(boxes[:, np.newaxis, 2], other[np.newaxis, :, 2]) - \
+            np.maximum(boxes[:, np.newaxis, 0], other[np.newaxis, :, 0]) + 1
+        h = np.minimum(boxes[:, np.newaxis, 3], other[np.newaxis, :, 3]) - \
+            np.maximum(boxes[:, np.newaxis, 1], other[np.newaxis, :, 1]) + 1
+        inter = np.maximum(w, 0) * np.maximum(h, 0)
+        area = (boxes[:, 2] - boxes[:, 0] + 1) * (boxes[:, 3] - boxes[:, 1] + 1)
+        other_area = (other[:, 2] - other[:, 0] + 1) * (other[:, 3] - other[:, 1] + 1)
+        return inter / (area[:, np.newaxis] + other_area[np.newaxis, :] - inter)
@@ -0,0 +1,16 @@
+from absl import app
+
+
+def run_script(define_flags, main):
+    """
+    Define the command line flags of a script and run it with absl. Scripts that are also imported as libraries
+    (retinaface_server, retinaface_multistream...) only define their flags here, so that importing several of them
+    does not define the same flags twice
+    :param define_flags: function defining the absl flags of the script
+    :param main: absl main function of the script
+    """
+    define_flags()
+    try:
+        app.run(main)
+    except SystemExit:
+        pass
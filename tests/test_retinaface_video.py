@@ -0,0 +1,36 @@
+import numpy as np
+from retinaface_video import VideoRetinaFace
+
+
+class _NoFaceDetector(object):
+    """
+    Stand-in RetinaFace that never finds a face and counts its calls
+    """
+    def __init__(self):
+        self.detect_calls = 0
+        self.detect_rois_calls = 0
+
+    def detect(self, img, threshold=0.5):
+        self.detect_calls += 1
+        return np.zeros((0, 5)), np.zeros((0, 5, 2))
+
+    def detect_rois(self, img, rois, threshold=0.5, expand=0.5, roi_size=128):
+        self.detect_rois_calls += 1
+        return np.zeros((0, 5)), np.zeros((0, 5, 2))
+
+
+def _moving_frames(n, height=120, width=160):
+    rng = np.random.RandomState(0)
+    for _ in range(n):
+        yield rng.randint(0, 256, (height, width, 3)).astype(np.uint8)
+
+
+def test_moving_scene_without_faces_runs_full_detection_every_full_every_frames():
+    detector = _NoFaceDetector()
+    video_detector = VideoRetinaFace(detector, motion_threshold=2.0, full_every=10)
+    modes = [mode for _, _, _, mode in video_detector.detect_stream(_moving_frames(30))]
+
+    assert detector.detect_calls == 3
+    assert detector.detect_rois_calls == 0
+    assert [i for i, mode in enumerate(modes) if mode == 'full'] == [0, 10, 20]
+    assert video_detector.stats == {'frames': 30, 'skipped': 0, 'roi': 27, 'full': 3}